@@ -0,0 +1,153 @@
+"""
+Hot path benchmarks against local Postgres and Redis (settings are taken from `.env` as for the app).
+
+Generate the dataset first, pointing resources to the stub server for the checker benchmark:
+    python -m benchmarks.dataset --resources 2000 --statuses 20 --feed-items 2000 \
+        --stub-url http://127.0.0.1:8099 --reset
+
+Then run (the stub server is started in-process on `--stub-port`):
+    python -m benchmarks.bench_hotpaths --repeat 20 --output hotpaths.json
+
+Celery tasks run eagerly in this process, so no worker is needed.
+"""
+import argparse
+import random
+import time
+
+from benchmarks.common import (emit_results, make_zip_archive, measure,
+                               summarize)
+from benchmarks.dataset import make_ingestion_lines
+from benchmarks.stub_server import start_stub_server
+from main import create_app
+from main.app import db as sqla
+from main.db.models import WebResource
+from main.service import db
+from main.tasks import (get_response_from_resources,
+                        process_urls_from_zip_archive)
+from main.utils.checker import PROBE_MODES
+
+BENCHMARKS = ["list", "ingest", "check", "feed", "resource_page"]
+
+
+def bench_list(app, repeat: int) -> dict:
+    """`get_web_resources_query` with pagination: first page, last page and filtered page."""
+    results = {}
+
+    def paginate(page: int, per_page: int = 10, **filters):
+        with app.test_request_context():
+            query = db.get_web_resources_query(left_join=True, **filters)
+            return db.paginate_query(query, page, per_page, "main.get_resources")
+
+    last_page = paginate(1)["_meta"]["total_pages"] or 1
+
+    results["first_page"] = measure(lambda: paginate(1), repeat=repeat)
+    results["last_page"] = measure(lambda: paginate(last_page), repeat=repeat)
+    results["available_filter"] = measure(lambda: paginate(1, is_available="true"), repeat=repeat)
+    results["per_page_100"] = measure(lambda: paginate(1, per_page=100), repeat=repeat)
+    return results
+
+
+def bench_ingest(app, repeat: int, lines: int, files: int) -> dict:
+    """`process_urls_from_zip_archive` on synthetic archives with 10% invalid lines."""
+    samples = []
+    for run in range(repeat):
+        archive = make_zip_archive(make_ingestion_lines(lines, seed=run), files=files)
+        with app.app_context():
+            request_id = db.create_file_processing_request()
+
+        started = time.perf_counter()
+        process_urls_from_zip_archive.apply(kwargs=dict(zip_file=archive, request_id=request_id))
+        samples.append(time.perf_counter() - started)
+
+    result = summarize(samples)
+    result["lines"] = lines
+    result["lines_per_second"] = lines / (sum(samples) / len(samples))
+    return result
+
+
+def bench_check(app, repeat: int) -> dict:
+    """`get_response_from_resources` over the whole table in every probe mode."""
+    with app.app_context():
+        resources = sqla.session.query(WebResource).count()
+
+    probe_mode = app.config["CHECKER"]["PROBE_MODE"]
+    results = {}
+    for mode in PROBE_MODES:
+        app.config["CHECKER"]["PROBE_MODE"] = mode
+
+        samples = []
+        bytes_received = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            stats = get_response_from_resources.apply().result
+            samples.append(time.perf_counter() - started)
+            bytes_received.append(stats["bytes_received"])
+
+        result = summarize(samples)
+        result["resources"] = resources
+        result["probes_per_second"] = resources / (sum(samples) / len(samples))
+        result["bytes_per_run"] = sum(bytes_received) / len(bytes_received)
+        results[mode] = result
+
+    app.config["CHECKER"]["PROBE_MODE"] = probe_mode
+    return results
+
+
+def bench_feed(app, repeat: int) -> dict:
+    def get_feed():
+        with app.app_context():
+            db.get_news_items()
+
+    return measure(get_feed, repeat=repeat)
+
+
+def bench_resource_page(app, repeat: int) -> dict:
+    with app.app_context():
+        uuids = [row.uuid for row in sqla.session.query(WebResource.uuid).limit(1000)]
+    rng = random.Random(0)
+
+    def get_page():
+        with app.app_context():
+            db.get_resource_page(resource_uuid=rng.choice(uuids))
+
+    return measure(get_page, repeat=repeat)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--only", default=",".join(BENCHMARKS), help=f"comma separated subset of {BENCHMARKS}")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--check-repeat", type=int, default=1)
+    parser.add_argument("--ingest-repeat", type=int, default=3)
+    parser.add_argument("--ingest-lines", type=int, default=10000)
+    parser.add_argument("--ingest-files", type=int, default=1)
+    parser.add_argument("--stub-port", type=int, default=8099)
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+
+    selected = args.only.split(",")
+
+    app = create_app()
+    app.extensions["celery"].conf.task_always_eager = True
+
+    results = {}
+    if "list" in selected:
+        results["list"] = bench_list(app, args.repeat)
+    if "ingest" in selected:
+        results["ingest"] = bench_ingest(app, args.ingest_repeat, args.ingest_lines, args.ingest_files)
+    if "check" in selected:
+        stub_server = start_stub_server(port=args.stub_port)
+        try:
+            results["check"] = bench_check(app, args.check_repeat)
+        finally:
+            stub_server.shutdown()
+    if "feed" in selected:
+        results["feed"] = bench_feed(app, args.repeat)
+    if "resource_page" in selected:
+        results["resource_page"] = bench_resource_page(app, args.repeat)
+
+    emit_results(benchmark="hotpaths", results=results, output=args.output)
+
+
+if __name__ == "__main__":
+    main()
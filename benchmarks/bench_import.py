@@ -0,0 +1,105 @@
+"""
+Cold start (import time) of the celery worker and web entry points.
+
+Every target is imported in a fresh interpreter with `python -X importtime`, so module execution
+(including app creation at import of the entry point) is accounted. Reported values are medians over runs.
+
+Usage:
+    python -m benchmarks.bench_import --runs 5 --output import.json
+"""
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+from typing import Dict, List
+
+from benchmarks.common import emit_results
+
+TARGETS = {
+    "worker": "main.make_celery",
+    "web": "entry",
+}
+
+# modules that the worker entry point is not supposed to import
+WEB_ONLY_MODULES = ["main.routes", "main.api.routes", "flask_wtf", "wtforms"]
+
+IMPORTTIME_RE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+BASE_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run_importtime(module: str) -> Dict:
+    """Import `module` in a fresh interpreter and parse `-X importtime` output."""
+    started = time.perf_counter()
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=BASE_PATH,
+        capture_output=True,
+        text=True,
+    )
+    wall_time = time.perf_counter() - started
+
+    if process.returncode != 0:
+        raise RuntimeError(f"Import of {module} failed:\n{process.stderr}")
+
+    modules = {}
+    total_us = 0
+    for line in process.stderr.splitlines():
+        match = IMPORTTIME_RE.match(line)
+        if match is None:
+            continue
+        _, cumulative, indent, name = match.groups()
+        modules[name] = int(cumulative)
+        # top level imports have a single space of indentation
+        if len(indent) == 1:
+            total_us += int(cumulative)
+
+    return {"wall_time_s": wall_time, "import_time_us": total_us, "modules": modules}
+
+
+def benchmark_target(module: str, runs: int, top: int) -> Dict:
+    samples: List[Dict] = [run_importtime(module) for _ in range(runs)]
+    modules = samples[-1]["modules"]
+
+    slowest = sorted(
+        (name for name in modules if name.startswith("main") or "." not in name),
+        key=lambda name: modules[name],
+        reverse=True,
+    )[:top]
+
+    return {
+        "module": module,
+        "runs": runs,
+        "wall_time_ms": statistics.median(sample["wall_time_s"] for sample in samples) * 1000,
+        "import_time_ms": statistics.median(sample["import_time_us"] for sample in samples) / 1000,
+        "modules_imported": len(modules),
+        "web_only_modules_imported": [name for name in WEB_ONLY_MODULES if name in modules],
+        "slowest_ms": {name: modules[name] / 1000 for name in slowest},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--target", choices=[*TARGETS, "all"], default="all")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15, help="number of slowest modules to report")
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+
+    targets = TARGETS if args.target == "all" else {args.target: TARGETS[args.target]}
+
+    emit_results(
+        benchmark="import",
+        results={
+            name: benchmark_target(module, runs=args.runs, top=args.top)
+            for name, module in targets.items()
+        },
+        output=args.output,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Request latency with and without the websocket log handler attached.
+
+Requests to `/test_logs/` (several log calls per request) are made through the Flask test client
+with three variants of the websocket handler:
+    - `none`: websocket handler detached;
+    - `sync`: every record is emitted to socket.io inside the request (previous behaviour);
+    - `queued`: records are put into a bounded queue and delivered in batches by the listener thread.
+
+`--emit-delay-ms` simulates slow socket.io delivery (slow clients, remote message queue).
+
+Usage:
+    python -m benchmarks.bench_logging --requests 2000 --emit-delay-ms 1 --output logging.json
+"""
+import argparse
+import logging
+import time
+
+from benchmarks.common import emit_results, measure
+from main import create_app, socketio
+
+
+class SyncWebSocketHandler(logging.Handler):
+    """Previous handler implementation: emits every record to socket.io synchronously."""
+
+    def emit(self, record: logging.LogRecord):
+        socketio.emit(
+            event="new_log",
+            data={"message": self.format(record), "level": record.levelname},
+            namespace="/logs",
+        )
+
+
+def slow_down_emit(delay: float):
+    """Make every socket.io emit take at least `delay` seconds."""
+    original_emit = socketio.emit
+
+    def emit(*args, **kwargs):
+        time.sleep(delay)
+        return original_emit(*args, **kwargs)
+
+    socketio.emit = emit
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--emit-delay-ms", type=float, default=0.0)
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+
+    app = create_app()
+
+    if args.emit_delay_ms:
+        slow_down_emit(args.emit_delay_ms / 1000)
+
+    queue_handler = app.extensions["ws_log_queue_handler"]
+    sync_handler = SyncWebSocketHandler()
+    sync_handler.setFormatter(logging.Formatter(**app.config["LOGGING"]["WS"]["FORMATTER"]))
+
+    client = app.test_client()
+
+    def make_request():
+        client.get("/test_logs/")
+
+    results = {}
+
+    app.logger.removeHandler(queue_handler)
+    results["none"] = measure(make_request, repeat=args.requests, warmup=10)
+
+    app.logger.addHandler(sync_handler)
+    results["sync"] = measure(make_request, repeat=args.requests, warmup=10)
+    app.logger.removeHandler(sync_handler)
+
+    app.logger.addHandler(queue_handler)
+    results["queued"] = measure(make_request, repeat=args.requests, warmup=10)
+    results["queued"]["dropped_records"] = queue_handler.dropped
+
+    emit_results(
+        benchmark="logging",
+        results={
+            "requests": args.requests,
+            "emit_delay_ms": args.emit_delay_ms,
+            "variants": results,
+        },
+        output=args.output,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Serialization cost of `/api/resources/` list payloads per 1,000 rows.
+
+Variants:
+    - `schema`: previous path, `ResourceGetSchema` per row, `PaginatedResourceListSchema` (which keeps
+      only `ListResourceGetSchemaItem` fields of items) and `jsonify`;
+    - `fast_json`: payload built from rows by `main.serializers`, encoded with the stdlib;
+    - `fast_orjson`: the same encoded with orjson (skipped if it is not installed).
+
+Rows are synthetic, shaped like rows of `get_web_resources_query(left_join=True)`, with a
+screenshot of `--screenshot-kb` in every `--screenshot-every` row. Every variant is checked to
+produce the same bytes as `schema`.
+
+Usage:
+    python -m benchmarks.bench_serialization --rows 1000 --repeat 50 --output serialization.json
+"""
+import argparse
+import os
+import random
+import uuid
+
+from flask import Flask, jsonify
+
+from benchmarks.common import emit_results, measure
+from main import serializers
+from main.db import schemas
+
+
+class BenchRow:
+    """Stand-in for SQLAlchemy `Row` with the used interface."""
+
+    def __init__(self, values: dict):
+        self._mapping = values
+
+    def _asdict(self) -> dict:
+        return dict(self._mapping)
+
+
+def make_rows(count: int, screenshot_every: int, screenshot_kb: int, seed: int = 0):
+    rng = random.Random(seed)
+    screenshot = os.urandom(screenshot_kb * 1024)
+    return [
+        BenchRow({
+            "id": index,
+            "uuid": uuid.UUID(int=rng.getrandbits(128), version=4),
+            "full_url": f"https://site{index % 50}.example.com/bench/page{index}?ref={index % 7}",
+            "status_code": rng.choice([200, 200, 200, 301, 404, 503, None]),
+            "is_available": rng.choice([True, True, False, None]),
+            "domain_zone": "com",
+            "domain": f"site{index % 50}.example.com",
+            "screenshot": screenshot if screenshot_every and index % screenshot_every == 0 else None,
+            "protocol": "https",
+        })
+        for index in range(count)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--screenshot-every", type=int, default=10, help="0 - no screenshots")
+    parser.add_argument("--screenshot-kb", type=int, default=64)
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+
+    rows = make_rows(args.rows, args.screenshot_every, args.screenshot_kb)
+    meta = {"page": 1, "per_page": args.rows, "total_pages": 1, "total_items": args.rows}
+    links = {"self": f"/api/resources/?page=1&per_page={args.rows}", "next": None, "prev": None}
+
+    app = Flask(__name__)
+
+    def schema_path() -> bytes:
+        response = schemas.PaginatedResourceListSchema(
+            items=[schemas.ResourceGetSchema(**row._asdict()).dict() for row in rows],
+            meta=meta,
+            links=links,
+        )
+        return jsonify(response.dict()).get_data()
+
+    def fast_path(backend: str) -> bytes:
+        return serializers.dumps(serializers.resource_list(rows, meta=meta, links=links), backend=backend) + b"\n"
+
+    variants = {
+        "schema": schema_path,
+        "fast_json": lambda: fast_path("json"),
+    }
+    if serializers.orjson is not None:
+        variants["fast_orjson"] = lambda: fast_path("orjson")
+
+    results = {}
+    with app.app_context():
+        expected = schema_path()
+        for name, func in variants.items():
+            result = measure(func, repeat=args.repeat)
+            result["per_1000_rows_ms"] = result["p50_ms"] * 1000 / args.rows
+            result["identical_output"] = func() == expected
+            results[name] = result
+
+    emit_results(benchmark="serialization", results=results, output=args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Requests per second of the development server (`entry.py`) against the production serving mode (gunicorn).
+
+Both servers are started from the project root in turn on `--port` with the settings from `.env` (local
+Postgres and Redis) and loaded by `benchmarks.loadtest` with the same read-only traffic mix, so the
+DB is not changed between runs. Seed it with `python -m benchmarks.dataset` first.
+
+Usage:
+    python -m benchmarks.bench_serving --workers 4 --worker-class gthread --concurrency 32 --duration 30
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from typing import Dict, List
+
+from benchmarks.common import emit_results
+from benchmarks.loadtest import parse_mix, run_load
+
+BASE_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def wait_ready(base_url: str, process: subprocess.Popen, timeout: float) -> None:
+    """Poll the resource list until the server responds."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server exited with code {process.returncode}")
+        try:
+            with urllib.request.urlopen(f"{base_url}/api/resources/?per_page=1", timeout=1):
+                return
+        except (OSError, urllib.error.URLError):
+            time.sleep(0.2)
+    raise RuntimeError(f"Server is not ready after {timeout} seconds")
+
+
+def serve_and_load(command: List[str], env: Dict[str, str], base_url: str, args) -> dict:
+    process = subprocess.Popen(
+        command,
+        cwd=BASE_PATH,
+        env={**os.environ, **env},
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        wait_ready(base_url, process, args.startup_timeout)
+        return run_load(
+            base_url=base_url,
+            mix=parse_mix(args.mix),
+            concurrency=args.concurrency,
+            duration=args.duration,
+            warmup=args.warmup,
+            timeout=args.timeout,
+            upload_lines=0,
+            seed=args.seed,
+        )
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=5050)
+    parser.add_argument("--workers", type=int, default=4, help="gunicorn worker processes")
+    parser.add_argument("--worker-class", default="gthread", help="gthread, eventlet or gevent")
+    parser.add_argument("--threads", type=int, default=8, help="threads per gthread worker")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=30, help="measured seconds per server")
+    parser.add_argument("--warmup", type=float, default=5)
+    parser.add_argument("--mix", default="list=60,page=25,feed=15", help="read-only request weights")
+    parser.add_argument("--timeout", type=float, default=10)
+    parser.add_argument("--startup-timeout", type=float, default=30)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+
+    base_url = f"http://127.0.0.1:{args.port}"
+    modes = {
+        "dev_server": (
+            [sys.executable, "entry.py"],
+            {"PORT": str(args.port)},
+        ),
+        "gunicorn": (
+            [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "entry:app"],
+            {
+                "WEB_BIND": f"127.0.0.1:{args.port}",
+                "WEB_CONCURRENCY": str(args.workers),
+                "WEB_WORKER_CLASS": args.worker_class,
+                "WEB_THREADS": str(args.threads),
+            },
+        ),
+    }
+
+    results = {}
+    for name, (command, env) in modes.items():
+        report = serve_and_load(command, env, base_url, args)
+        results[name] = {
+            "settings": env,
+            "requests_per_second": report["requests_per_second"],
+            "error_rate": report["error_rate"],
+            "endpoints": report["endpoints"],
+        }
+
+    dev_rps = results["dev_server"]["requests_per_second"]
+    results["speedup"] = results["gunicorn"]["requests_per_second"] / dev_rps if dev_rps else None
+
+    emit_results(benchmark="serving", results=results, output=args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+import csv
+import io
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import zipfile
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional
+
+# path marker of generated URLs, see benchmarks.dataset
+BENCH_MARKER = "/bench/"
+
+
+def get_git_commit() -> Optional[str]:
+    """Return short hash of the current commit or None outside of a git checkout."""
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"],
+            stderr=subprocess.DEVNULL,
+            text=True,
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    """Summarize durations (in seconds) as milliseconds with percentiles."""
+    if not samples:
+        return {"count": 0}
+
+    ordered = sorted(samples)
+
+    def percentile(p: float) -> float:
+        index = min(len(ordered) - 1, max(0, round(p / 100 * len(ordered)) - 1))
+        return ordered[index] * 1000
+
+    return {
+        "count": len(ordered),
+        "mean_ms": statistics.fmean(ordered) * 1000,
+        "p50_ms": percentile(50),
+        "p90_ms": percentile(90),
+        "p99_ms": percentile(99),
+        "max_ms": ordered[-1] * 1000,
+    }
+
+
+def measure(func: Callable, repeat: int, warmup: int = 1) -> Dict[str, float]:
+    """Call `func` `repeat` times after `warmup` calls and summarize durations."""
+    for _ in range(warmup):
+        func()
+
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - started)
+
+    return summarize(samples)
+
+
+def emit_results(benchmark: str, results: dict, output: Optional[str] = None) -> dict:
+    """Print results as JSON (and write them to `output` if given) so they can be compared between commits."""
+    report = {
+        "benchmark": benchmark,
+        "commit": get_git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "results": results,
+    }
+
+    text = json.dumps(report, indent=2)
+    if output:
+        with open(output, "w") as file:
+            file.write(text + "\n")
+
+    sys.stdout.write(text + "\n")
+    return report
+
+
+def make_zip_archive(lines: List[str], files: int = 1) -> bytes:
+    """Build ZIP archive with `lines` split between `files` CSV files."""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        for file_number in range(files):
+            content = io.StringIO()
+            writer = csv.writer(content)
+            for line in lines[file_number::files]:
+                writer.writerow([line])
+            archive.writestr(f"urls_{file_number}.csv", content.getvalue())
+    return buffer.getvalue()
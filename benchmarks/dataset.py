@@ -0,0 +1,167 @@
+"""
+Synthetic dataset for benchmarks and load tests.
+
+Creates N web resources with M statuses each and K news feed items. Resources either point to the
+local stub server (`--stub-url`, mix of fast, slow, failing and redirecting sites) or to fake
+domains that are never requested. All generated URLs contain `/bench/` in the path, so
+`--reset` removes previously generated data only.
+
+Usage:
+    python -m benchmarks.dataset --resources 10000 --statuses 20 --feed-items 5000 --reset
+    python -m benchmarks.dataset --resources 500 --stub-url http://127.0.0.1:8099 --reset
+"""
+import argparse
+import random
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional
+
+from sqlalchemy import delete, insert, select
+
+from benchmarks.common import BENCH_MARKER
+from main import create_worker_app
+from main.app import db
+from main.db.models import (EventType, NewsFeedItem, WebResource,
+                            WebResourceStatus)
+from main.utils.urlparser import parse_url
+
+BATCH_SIZE = 1000
+
+DOMAIN_ZONES = ["com", "org", "net", "ru", "io"]
+
+# share of stub server site kinds
+STUB_KINDS = [("ok", 0.7), ("slow", 0.1), ("fail", 0.1), ("redirect", 0.1)]
+
+
+def make_url(index: int, rng: random.Random, stub_url: Optional[str], paths_per_domain: int) -> str:
+    if stub_url:
+        kind = rng.choices([kind for kind, _ in STUB_KINDS], weights=[weight for _, weight in STUB_KINDS])[0]
+        query = {"slow": "?delay=0.2", "fail": "?status=503", "redirect": "?to=/ok/"}.get(kind, "")
+        return f"{stub_url.rstrip('/')}/{kind}{BENCH_MARKER}{index}{query}"
+
+    domain_index = index // paths_per_domain
+    zone = DOMAIN_ZONES[domain_index % len(DOMAIN_ZONES)]
+    return f"https://site{domain_index}.example.{zone}{BENCH_MARKER}page{index}?ref={index % 7}"
+
+
+def make_ingestion_lines(count: int, invalid_ratio: float = 0.1, seed: int = 0) -> List[str]:
+    """Unique URLs (with `invalid_ratio` of invalid lines) for archive processing benchmarks."""
+    rng = random.Random(seed)
+    token = uuid.uuid4().hex[:8]
+    lines = []
+    for index in range(count):
+        if rng.random() < invalid_ratio:
+            lines.append(f"not a url {index}")
+        else:
+            lines.append(f"https://ingest{index % 97}.example.com{BENCH_MARKER}{token}/{index}")
+    return lines
+
+
+def reset_dataset() -> None:
+    """Delete previously generated resources with related rows."""
+    resource_ids = select(WebResource.id).where(WebResource.full_url.contains(BENCH_MARKER))
+    db.session.execute(delete(WebResourceStatus).where(WebResourceStatus.resource_id.in_(resource_ids)))
+    db.session.execute(delete(NewsFeedItem).where(NewsFeedItem.resource_id.in_(resource_ids)))
+    db.session.execute(delete(WebResource).where(WebResource.full_url.contains(BENCH_MARKER)))
+    db.session.commit()
+
+
+def generate_dataset(
+    resources: int,
+    statuses: int,
+    feed_items: int,
+    stub_url: Optional[str] = None,
+    paths_per_domain: int = 20,
+    seed: int = 0,
+) -> dict:
+    """Insert generated rows in batches and return counts."""
+    rng = random.Random(seed)
+    now = datetime.now(timezone.utc)
+
+    for start in range(0, resources, BATCH_SIZE):
+        rows = []
+        for index in range(start, min(start + BATCH_SIZE, resources)):
+            url = make_url(index, rng, stub_url, paths_per_domain)
+            parsed = parse_url(url)
+            rows.append(dict(
+                uuid=uuid.uuid4(),
+                full_url=url,
+                protocol=parsed.protocol,
+                domain=parsed.domain,
+                domain_zone=parsed.domain_zone,
+                url_path=parsed.path,
+                query_params=parsed.query_params,
+                unavailable_count=0,
+            ))
+        db.session.execute(insert(WebResource), rows)
+        db.session.commit()
+
+    resource_ids = db.session.scalars(
+        select(WebResource.id).where(WebResource.full_url.contains(BENCH_MARKER)).order_by(WebResource.id)
+    ).all()
+
+    status_rows = []
+    for resource_id in resource_ids:
+        for number in range(statuses):
+            is_available = rng.random() < 0.8
+            status_rows.append(dict(
+                resource_id=resource_id,
+                status_code=200 if is_available else 503,
+                is_available=is_available,
+                request_time=now - timedelta(hours=12 * (statuses - number)),
+            ))
+            if len(status_rows) >= BATCH_SIZE:
+                db.session.execute(insert(WebResourceStatus), status_rows)
+                status_rows = []
+    if status_rows:
+        db.session.execute(insert(WebResourceStatus), status_rows)
+    db.session.commit()
+
+    feed_rows = [
+        dict(
+            event_type=EventType.STATUS_CHANGED,
+            resource_id=rng.choice(resource_ids),
+            timestamp=now - timedelta(minutes=number),
+        )
+        for number in range(feed_items if resource_ids else 0)
+    ]
+    for start in range(0, len(feed_rows), BATCH_SIZE):
+        db.session.execute(insert(NewsFeedItem), feed_rows[start:start + BATCH_SIZE])
+    db.session.commit()
+
+    return {
+        "resources": len(resource_ids),
+        "statuses": len(resource_ids) * statuses,
+        "feed_items": len(feed_rows),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--resources", type=int, default=1000)
+    parser.add_argument("--statuses", type=int, default=10, help="statuses per resource")
+    parser.add_argument("--feed-items", type=int, default=1000)
+    parser.add_argument("--paths-per-domain", type=int, default=20)
+    parser.add_argument("--stub-url", default=None, help="base URL of benchmarks.stub_server")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--reset", action="store_true", help="delete previously generated data first")
+    args = parser.parse_args()
+
+    app = create_worker_app()
+    with app.app_context():
+        if args.reset:
+            reset_dataset()
+        counts = generate_dataset(
+            resources=args.resources,
+            statuses=args.statuses,
+            feed_items=args.feed_items,
+            stub_url=args.stub_url,
+            paths_per_domain=args.paths_per_domain,
+            seed=args.seed,
+        )
+
+    print(counts)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,306 @@
+"""
+Synthetic load test for the HTTP API of a running instance (`entry.py` or production serving mode).
+
+Workers send requests back to back (closed loop), each request kind is picked by weight from the
+traffic mix:
+    list      - GET /api/resources/ with random page and filters
+    page      - GET /api/resources/<uuid>/ of an existing resource
+    feed      - GET /feed/
+    post_url  - POST /api/resources/ with a new URL in JSON
+    upload    - POST /api/resources/ with a ZIP archive of URLs
+
+Seed the instance with `python -m benchmarks.dataset` first. The scenario can be given as a JSON
+file with the same keys as the command line options, e.g.
+    {"concurrency": 32, "duration": 60, "mix": {"list": 60, "page": 25, "feed": 10, "post_url": 4, "upload": 1}}
+
+Usage:
+    python -m benchmarks.loadtest --url http://127.0.0.1:5000 --concurrency 16 --duration 60 --output before.json
+    python -m benchmarks.loadtest --scenario scenario.json --compare before.json --output after.json
+"""
+import argparse
+import http.client
+import json
+import random
+import threading
+import time
+import uuid
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlencode, urlparse
+
+from benchmarks.common import (BENCH_MARKER, emit_results, make_zip_archive,
+                               summarize)
+
+DEFAULT_MIX = {"list": 60, "page": 25, "feed": 10, "post_url": 4, "upload": 1}
+
+DOMAIN_ZONES = ["com", "org", "net", "ru", "io"]
+
+
+class Target:
+    """Keep-alive connection of a single worker to the tested instance."""
+
+    def __init__(self, base_url: str, timeout: float):
+        parsed = urlparse(base_url)
+        self.host = parsed.hostname
+        self.port = parsed.port or 80
+        self.timeout = timeout
+        self.connection: Optional[http.client.HTTPConnection] = None
+
+    def request(self, method: str, path: str, body: bytes = None, headers: dict = None) -> Tuple[int, bytes]:
+        if self.connection is None:
+            self.connection = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        try:
+            self.connection.request(method, path, body=body, headers=headers or {})
+            response = self.connection.getresponse()
+            return response.status, response.read()
+        except (OSError, http.client.HTTPException):
+            self.connection.close()
+            self.connection = None
+            raise
+
+
+class Scenario:
+    """Builds requests of every kind of the traffic mix."""
+
+    def __init__(self, uuids: List[str], upload_lines: int, seed: int):
+        self.uuids = uuids
+        self.upload_lines = upload_lines
+        self.rng = random.Random(seed)
+        self.token = uuid.uuid4().hex[:8]
+        self.counter = 0
+        self.lock = threading.Lock()
+
+    def _next_number(self) -> int:
+        with self.lock:
+            self.counter += 1
+            return self.counter
+
+    def build(self, kind: str) -> Tuple[str, str, Optional[bytes], dict]:
+        if kind == "list":
+            params = {"page": self.rng.randint(1, 20), "per_page": self.rng.choice([10, 10, 10, 50])}
+            if self.rng.random() < 0.3:
+                params["availability"] = self.rng.choice(["true", "false"])
+            if self.rng.random() < 0.3:
+                params["domain_zone"] = self.rng.choice(DOMAIN_ZONES)
+            return "GET", f"/api/resources/?{urlencode(params)}", None, {}
+
+        if kind == "page":
+            return "GET", f"/api/resources/{self.rng.choice(self.uuids)}/", None, {}
+
+        if kind == "feed":
+            return "GET", "/feed/", None, {}
+
+        if kind == "post_url":
+            url = f"https://load{self.rng.randint(0, 99)}.example.com{BENCH_MARKER}{self.token}/{self._next_number()}"
+            body = json.dumps({"url": url}).encode()
+            return "POST", "/api/resources/", body, {"Content-Type": "application/json"}
+
+        if kind == "upload":
+            number = self._next_number()
+            lines = [
+                f"https://upload.example.com{BENCH_MARKER}{self.token}/{number}/{line}"
+                for line in range(self.upload_lines)
+            ]
+            return ("POST", "/api/resources/") + encode_multipart("file", f"urls_{number}.zip", make_zip_archive(lines))
+
+        raise ValueError(f"Unknown request kind: {kind}")
+
+
+def encode_multipart(field: str, filename: str, content: bytes) -> Tuple[bytes, dict]:
+    boundary = uuid.uuid4().hex
+    body = (
+        f"--{boundary}\r\n"
+        f'Content-Disposition: form-data; name="{field}"; filename="{filename}"\r\n'
+        f"Content-Type: application/zip\r\n\r\n"
+    ).encode() + content + f"\r\n--{boundary}--\r\n".encode()
+    return body, {"Content-Type": f"multipart/form-data; boundary={boundary}"}
+
+
+def fetch_uuids(base_url: str, timeout: float, pages: int = 5) -> List[str]:
+    """Collect UUIDs of existing resources for resource page requests."""
+    target = Target(base_url, timeout)
+    uuids = []
+    for page in range(1, pages + 1):
+        status, body = target.request("GET", f"/api/resources/?page={page}&per_page=100")
+        if status != 200:
+            break
+        items = json.loads(body)["items"]
+        uuids.extend(item["uuid"] for item in items)
+        if len(items) < 100:
+            break
+    return uuids
+
+
+def run_load(
+    base_url: str,
+    mix: Dict[str, float],
+    concurrency: int,
+    duration: float,
+    warmup: float,
+    timeout: float,
+    upload_lines: int,
+    seed: int,
+) -> dict:
+    uuids = fetch_uuids(base_url, timeout)
+    if not uuids:
+        mix = {kind: weight for kind, weight in mix.items() if kind != "page"}
+
+    scenario = Scenario(uuids=uuids, upload_lines=upload_lines, seed=seed)
+    kinds = list(mix)
+    weights = [mix[kind] for kind in kinds]
+
+    latencies: Dict[str, List[float]] = defaultdict(list)
+    errors: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+    lock = threading.Lock()
+
+    started = time.monotonic()
+    measure_from = started + warmup
+    stop_at = measure_from + duration
+
+    def worker(worker_number: int):
+        rng = random.Random(seed + worker_number)
+        target = Target(base_url, timeout)
+
+        while True:
+            now = time.monotonic()
+            if now >= stop_at:
+                break
+
+            kind = rng.choices(kinds, weights=weights)[0]
+            method, path, body, headers = scenario.build(kind)
+
+            request_started = time.perf_counter()
+            try:
+                status, _ = target.request(method, path, body=body, headers=headers)
+                error = None if status < 400 or status == 409 else str(status)
+            except (OSError, http.client.HTTPException) as e:
+                error = type(e).__name__
+            elapsed = time.perf_counter() - request_started
+
+            if now < measure_from:
+                continue
+
+            with lock:
+                latencies[kind].append(elapsed)
+                if error is not None:
+                    errors[kind][error] += 1
+
+    threads = [threading.Thread(target=worker, args=(number,)) for number in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    endpoints = {}
+    total_requests = 0
+    total_errors = 0
+    for kind in kinds:
+        samples = latencies.get(kind, [])
+        error_count = sum(errors[kind].values())
+        total_requests += len(samples)
+        total_errors += error_count
+
+        endpoints[kind] = summarize(samples)
+        endpoints[kind]["requests_per_second"] = len(samples) / duration
+        endpoints[kind]["error_rate"] = error_count / len(samples) if samples else 0.0
+        endpoints[kind]["errors"] = dict(errors[kind])
+
+    return {
+        "base_url": base_url,
+        "concurrency": concurrency,
+        "duration_s": duration,
+        "mix": mix,
+        "requests": total_requests,
+        "requests_per_second": total_requests / duration,
+        "error_rate": total_errors / total_requests if total_requests else 0.0,
+        "endpoints": endpoints,
+    }
+
+
+def compare(baseline: dict, current: dict) -> dict:
+    """Relative change of throughput and latency percentiles against the baseline report."""
+    baseline = baseline.get("results", baseline)
+
+    def change(before, after):
+        return (after - before) / before if before else None
+
+    comparison = {
+        "requests_per_second": change(baseline["requests_per_second"], current["requests_per_second"]),
+        "endpoints": {},
+    }
+    for kind, stats in current["endpoints"].items():
+        before = baseline["endpoints"].get(kind)
+        if not before or not stats.get("count") or not before.get("count"):
+            continue
+        comparison["endpoints"][kind] = {
+            key: change(before[key], stats[key])
+            for key in ("requests_per_second", "p50_ms", "p90_ms", "p99_ms")
+        }
+    return comparison
+
+
+def parse_mix(value: str) -> Dict[str, float]:
+    """Parse `list=60,page=25,...` into weights."""
+    mix = {}
+    for part in value.split(","):
+        kind, _, weight = part.partition("=")
+        mix[kind.strip()] = float(weight)
+    return mix
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenario", default=None, help="JSON file with options, command line values win")
+    parser.add_argument("--url", default=None, help="base URL of the instance (default http://127.0.0.1:5000)")
+    parser.add_argument("--concurrency", type=int, default=None)
+    parser.add_argument("--duration", type=float, default=None, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=None, help="seconds before measuring")
+    parser.add_argument("--mix", default=None, help="weights, e.g. list=60,page=25,feed=10,post_url=4,upload=1")
+    parser.add_argument("--upload-lines", type=int, default=None, help="URLs per uploaded archive")
+    parser.add_argument("--timeout", type=float, default=None)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--label", default=None, help="free text stored in the report, e.g. serving settings")
+    parser.add_argument("--compare", default=None, help="previous report to compare with")
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+
+    options = {
+        "url": "http://127.0.0.1:5000",
+        "concurrency": 8,
+        "duration": 30.0,
+        "warmup": 5.0,
+        "mix": DEFAULT_MIX,
+        "upload_lines": 100,
+        "timeout": 30.0,
+        "seed": 0,
+        "label": None,
+    }
+    if args.scenario:
+        with open(args.scenario) as file:
+            options.update(json.load(file))
+    for key in options:
+        value = getattr(args, key)
+        if value is not None:
+            options[key] = parse_mix(value) if key == "mix" else value
+
+    results = run_load(
+        base_url=options["url"],
+        mix=options["mix"],
+        concurrency=options["concurrency"],
+        duration=options["duration"],
+        warmup=options["warmup"],
+        timeout=options["timeout"],
+        upload_lines=options["upload_lines"],
+        seed=options["seed"],
+    )
+    results["label"] = options["label"]
+
+    if args.compare:
+        with open(args.compare) as file:
+            results["comparison"] = compare(json.load(file), results)
+
+    emit_results(benchmark="loadtest", results=results, output=args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Local HTTP target that simulates monitored sites for checker benchmarks.
+
+Paths (any suffix after the first segment is ignored, so every resource can have a unique URL):
+    /ok/...                     - 200 with a small body
+    /slow/...?delay=0.5         - 200 after `delay` seconds
+    /fail/...?status=500        - responds with `status`
+    /redirect/...?to=/ok/       - 302 to `to`
+    /big/...?size=1048576       - 200 with a `size` bytes body
+    /nohead/...                 - 405 for HEAD, 200 for GET
+
+Usage:
+    python -m benchmarks.stub_server --port 8099
+"""
+import argparse
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+SMALL_BODY = b"<html><body>ok</body></html>"
+CHUNK = b"x" * 65536
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        # keep benchmark output clean
+        pass
+
+    def _send(self, status: int, body: bytes = b"", headers: dict = None, body_size: int = None):
+        size = len(body) if body_size is None else body_size
+
+        self.send_response(status)
+        self.send_header("Content-Length", str(size))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+
+        if self.command == "HEAD":
+            return
+
+        if body_size is None:
+            self.wfile.write(body)
+            return
+
+        remaining = body_size
+        while remaining > 0:
+            chunk = CHUNK[:min(remaining, len(CHUNK))]
+            self.wfile.write(chunk)
+            remaining -= len(chunk)
+
+    def _handle(self):
+        url = urlparse(self.path)
+        params = {key: values[0] for key, values in parse_qs(url.query).items()}
+        kind = url.path.strip("/").split("/")[0]
+
+        if kind == "ok":
+            self._send(200, SMALL_BODY)
+        elif kind == "slow":
+            time.sleep(float(params.get("delay", 0.5)))
+            self._send(200, SMALL_BODY)
+        elif kind == "fail":
+            self._send(int(params.get("status", 500)), SMALL_BODY)
+        elif kind == "redirect":
+            self._send(302, headers={"Location": params.get("to", "/ok/")})
+        elif kind == "big":
+            self._send(200, body_size=int(params.get("size", 1024 * 1024)))
+        elif kind == "nohead" and self.command == "HEAD":
+            self._send(405)
+        elif kind == "nohead":
+            self._send(200, SMALL_BODY)
+        else:
+            self._send(404, SMALL_BODY)
+
+    do_GET = _handle
+    do_HEAD = _handle
+
+
+def start_stub_server(host: str = "127.0.0.1", port: int = 8099) -> ThreadingHTTPServer:
+    """Start stub server in a daemon thread and return it (call `shutdown()` to stop)."""
+    server = ThreadingHTTPServer((host, port), StubHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8099)
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer((args.host, args.port), StubHandler)
+    server.daemon_threads = True
+    print(f"Stub server listening on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
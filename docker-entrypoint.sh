@@ -1,8 +1,16 @@
 #!/bin/sh
 set -e
 
+# run the given command (celery workers and beat), migrations are applied by the web app
+if [ "$#" -gt 0 ]; then
+    exec "$@"
+fi
+
 # apply migrations
 flask db upgrade
 
-# run app
-python3 entry.py
\ No newline at end of file
+# run app: gunicorn workers (see gunicorn.conf.py) or the development server with WEB_SERVER=dev
+if [ "$WEB_SERVER" = "dev" ]; then
+    exec python3 entry.py
+fi
+exec gunicorn -c gunicorn.conf.py entry:app
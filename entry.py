@@ -1,5 +1,10 @@
-from main import app, socketio
+import os
+
+from main import create_app, socketio
+
+app = create_app()
 
 
 if __name__ == "__main__":
-    socketio.run(app, allow_unsafe_werkzeug=True, host='0.0.0.0')
\ No newline at end of file
+    # development server, a single process; production mode is gunicorn (see gunicorn.conf.py)
+    socketio.run(app, allow_unsafe_werkzeug=True, host='0.0.0.0', port=int(os.getenv('PORT', 5000)))
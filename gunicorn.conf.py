@@ -0,0 +1,50 @@
+"""
+Production serving of the web app: `gunicorn -c gunicorn.conf.py entry:app`.
+
+Settings are taken from environment variables:
+    WEB_BIND          - address to listen on (default 0.0.0.0:5000)
+    WEB_CONCURRENCY   - number of worker processes (default 2 * CPU + 1)
+    WEB_WORKER_CLASS  - gthread (threads, default), eventlet or gevent (green threads, need the library)
+    WEB_THREADS       - threads per gthread worker (default 8)
+    WEB_CONNECTIONS   - simultaneous clients per eventlet/gevent worker (default 1000)
+    WEB_TIMEOUT       - seconds before a silent worker is restarted (default 30)
+    WEB_PRELOAD       - 1 to create the app once in the master (gthread only, see `reinit_after_fork`)
+
+Every worker runs its own copy of the app: DB pools, Redis connections and the log listener thread are
+created after fork. Socket.IO events are passed between workers through the Redis message queue.
+
+With gthread every open websocket of the logs page holds one of WEB_THREADS threads of its worker for
+as long as the page is open, so a worker serves HTTP requests with WEB_THREADS minus its websocket
+clients threads, and stops serving them once that many pages are open. Budget WEB_THREADS for the
+expected number of log viewers per worker, or use gevent when many clients watch the logs (gevent
+workers don't make psycopg2 cooperative, so DB queries block the other clients of the worker).
+"""
+import multiprocessing
+import os
+
+WORKER_CLASSES = ("gthread", "eventlet", "gevent")
+
+bind = os.getenv("WEB_BIND", "0.0.0.0:5000")
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count() * 2 + 1))
+
+worker_class = os.getenv("WEB_WORKER_CLASS", "gthread")
+if worker_class not in WORKER_CLASSES:
+    raise ValueError(f"Unknown WEB_WORKER_CLASS: {worker_class}, expected one of {', '.join(WORKER_CLASSES)}")
+
+threads = int(os.getenv("WEB_THREADS", 8))
+worker_connections = int(os.getenv("WEB_CONNECTIONS", 1000))
+timeout = int(os.getenv("WEB_TIMEOUT", 30))
+keepalive = 5
+
+# green workers monkey patch the stdlib after fork, so the app can't be imported before it
+preload_app = os.getenv("WEB_PRELOAD") == "1" and worker_class == "gthread"
+
+accesslog = "-"
+errorlog = "-"
+
+
+def post_worker_init(worker):
+    if preload_app:
+        from main.app import reinit_after_fork
+
+        reinit_after_fork(worker.wsgi)
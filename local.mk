@@ -1,18 +1,45 @@
+CELERY_WORKER = celery -A main.make_celery worker -l info
+
+# worker profiles, one per celery queue (see CELERY_QUEUES in main/app.py)
+CHECKER_CONCURRENCY ?= 8
+INGESTION_CONCURRENCY ?= 4
+MAINTENANCE_CONCURRENCY ?= 1
+
+# development server, single process
 run-app:
 	python3 entry.py
 
+# production serving mode, settings are WEB_* variables (see gunicorn.conf.py)
+run-app-prod:
+	gunicorn -c gunicorn.conf.py entry:app
+
+# single worker consuming all queues
 run-celery-worker:
-	celery -A main.make_celery worker -l info
+	$(CELERY_WORKER) -Q checker,ingestion,maintenance,celery
+
+# long IO-bound check runs: one prefetched task per process, so a run does not hold back others
+run-celery-worker-checker:
+	$(CELERY_WORKER) -Q checker -n checker@%h -c $(CHECKER_CONCURRENCY) --prefetch-multiplier 1
+
+# archive chunks are large and acknowledged late, prefetching more would only delay redelivery
+run-celery-worker-ingestion:
+	$(CELERY_WORKER) -Q ingestion -n ingestion@%h -c $(INGESTION_CONCURRENCY) --prefetch-multiplier 1
+
+run-celery-worker-maintenance:
+	$(CELERY_WORKER) -Q maintenance,celery -n maintenance@%h -c $(MAINTENANCE_CONCURRENCY) --prefetch-multiplier 4
 
 run-celery-beat:
 	celery -A main.make_celery beat -l info
 
 run-all:
 	$(MAKE) -f local.mk run-app &
-	$(MAKE) -f local.mk run-celery-worker &
+	$(MAKE) -f local.mk run-celery-worker-checker &
+	$(MAKE) -f local.mk run-celery-worker-ingestion &
+	$(MAKE) -f local.mk run-celery-worker-maintenance &
 	$(MAKE) -f local.mk run-celery-beat &
 
 stop-all:
 	pkill -f "python3 entry.py" &
-	pkill -f "celery -A main.make_celery worker -l info" &
+	pkill -f "gunicorn -c gunicorn.conf.py" &
+	pkill -f "celery -A main.make_celery worker" &
 	pkill -f "celery -A main.make_celery beat -l info" &
@@ -2,7 +2,6 @@ from flask import Blueprint
 from flask_socketio import SocketIO
 
 socketio = SocketIO()
-log_buffer = list()
 bp = Blueprint(
     name='main',
     url_prefix='/api',
@@ -10,14 +9,9 @@ bp = Blueprint(
     template_folder='templates',
     static_folder='templates',
 )
+views = Blueprint(
+    name='views',
+    import_name=__name__,
+)
 
-from .app import create_app
-
-app = create_app()
-
-from main import routes
-from main.api import routes as api_routes
-
-app.register_blueprint(blueprint=bp)
-socketio.init_app(app)
-app.logger.info("app started")
+from .app import create_app, create_worker_app
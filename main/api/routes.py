@@ -1,10 +1,20 @@
-from flask import Response, jsonify, request, url_for
+from flask import Response, current_app, jsonify, request, url_for
 from pydantic import ValidationError
+from werkzeug.exceptions import RequestEntityTooLarge
 
-from main import app, bp, log_buffer, socketio
+from main import bp, serializers, socketio
 from main.db import schemas
+from main.logger import parse_level
 from main.service import db, exceptions, handlers
-from main.utils.helpers import convert_to_serializable, make_int
+from main.utils.helpers import (convert_to_serializable, make_int,
+                                parse_datetime)
+from main.utils.latency import parse_window
+
+
+@bp.errorhandler(RequestEntityTooLarge)
+def request_too_large(e):
+    """Request body over `MAX_CONTENT_LENGTH`, rejected by Werkzeug before it is read."""
+    return jsonify({"Error": f"Request body is larger than {current_app.config['MAX_CONTENT_LENGTH']} bytes"}), 413
 
 
 @bp.route('/resources/', methods=['GET'])
@@ -17,16 +27,22 @@ def get_resources():
     page = make_int(request.args.get('page', default=1, type=int))
     per_page = make_int(request.args.get('per_page', default=10, type=int))
 
-    response = handlers.handle_get_resources_with_filters(
+    try:
+        fields = serializers.parse_fields(request.args.get('fields'))
+    except ValueError as e:
+        return jsonify({"Error": str(e)}), 400
+
+    response = handlers.handle_get_resources_payload(
         domain_zone=domain_zone,
         resource_id=resource_id,
         availability=availability,
         page=page,
         per_page=per_page,
         uuid=uuid,
+        fields=fields,
     )
 
-    return jsonify(response.dict())
+    return serializers.json_response(response)
 
 
 @bp.route("/resources/", methods=['POST'])
@@ -35,13 +51,20 @@ def create_url():
     Router for proceeding single URL from body or multiple URLs from zip with csv file.
     Create celery task if zip file was uploaded.
     """
+    try:
+        handlers.check_upload_size(
+            request.content_length, current_app.config["FILE_PROCESSING"]["ADMISSION"]["MAX_STAGED_BYTES"],
+        )
+    except exceptions.FileTooLargeError as e:
+        return jsonify({"Error": str(e)}), 413
+
     if request.is_json:
         body = request.get_json()
 
         try:
             url = handlers.handle_post_url_json(body)
 
-            app.logger.info(f"201 - User posted new URL on {url_for('.create_url')}")
+            current_app.logger.info(f"201 - User posted new URL on {url_for('.create_url')}")
 
             return Response(
                 url.json(),
@@ -53,7 +76,7 @@ def create_url():
             return jsonify({'error': 'Web resource already exists'}), 409
 
         except ValidationError as e:
-            app.logger.info(f"400 - User made bad request to {request.url}")
+            current_app.logger.info(f"400 - User made bad request to {request.url}")
             errors = convert_to_serializable(e.errors())
             response = {
                 'error': 'Validation error',
@@ -64,14 +87,29 @@ def create_url():
     elif request.files:
 
         try:
-            processing_request_id = handlers.handle_post_url_file(request.files)
+            processing_request_id, created = handlers.handle_post_url_file(request.files)
+
+            if not created:
+                current_app.logger.info(
+                    f"200 - User posted ZIP archive already processed by request {processing_request_id}"
+                )
+                return jsonify({"request_id": processing_request_id, "deduplicated": True}), 200
 
-            app.logger.info(
+            current_app.logger.info(
                 f"201 - User posted ZIP archive with URLs on {url_for('.create_url')}"
             )
 
             return jsonify({"request_id": processing_request_id}), 201
 
+        except exceptions.QueueFullError as e:
+            current_app.logger.info(f"429 - ZIP archive rejected, file processing queue is full: {e.queue}")
+            response = jsonify({"Error": str(e), "queue": e.queue})
+            response.headers["Retry-After"] = str(current_app.config["FILE_PROCESSING"]["ADMISSION"]["RETRY_AFTER"])
+            return response, 429
+
+        except exceptions.FileTooLargeError as e:
+            return jsonify({"Error": str(e)}), 413
+
         except ValidationError as e:
             errors = convert_to_serializable(e.errors())
             response = {
@@ -81,7 +119,7 @@ def create_url():
             return jsonify(response), 400
 
     else:
-        app.logger.info(
+        current_app.logger.info(
             f"400 - User made bad request to {url_for('.create_url')}"
         )
         return jsonify(
@@ -93,11 +131,11 @@ def create_url():
 def delete_url_structure(web_resource_id: int):
     try:
         db.delete_web_resource_by_id(web_resource_id)
-        app.logger.info(f"204 - Resource with ID={web_resource_id} was deleted.")
+        current_app.logger.info(f"204 - Resource with ID={web_resource_id} was deleted.")
         return Response(status=204)
 
     except exceptions.NotFoundError:
-        app.logger.info(f"404 - Attempt to delete resource with ID={web_resource_id} that does not exist.")
+        current_app.logger.info(f"404 - Attempt to delete resource with ID={web_resource_id} that does not exist.")
         return Response(status=404)
 
 
@@ -107,18 +145,48 @@ def get_status_of_processing_request(request_id: int):
     try:
         status_info = handlers.handle_get_request_status(
             request_id=request_id,
-            storage_client=app.extensions["redis"],
+            storage_client=current_app.extensions["redis"],
         )
         return jsonify(status_info)
 
     except exceptions.NotFoundError:
-        app.logger.info(f"404 - GET request to {request.url} with non-existing ID")
+        current_app.logger.info(f"404 - GET request to {request.url} with non-existing ID")
         return jsonify({"Error": "Request with the given ID was not found."}), 404
 
 
+@bp.route("/processing-requests/queue/", methods=["GET"])
+def get_processing_queue():
+    """Return pending and in process file processing requests, bytes of their archives and admission caps."""
+    return jsonify(handlers.handle_get_processing_queue())
+
+
+@bp.route("/processing-requests/<int:request_id>/errors/", methods=["GET"])
+def get_processing_request_errors(request_id: int):
+    """Return invalid lines of the processing request by pages of `limit` lines after the `cursor` line number."""
+    errors_conf = current_app.config["FILE_PROCESSING"]["ERRORS"]
+    cursor = request.args.get("cursor")
+    limit = request.args.get("limit", default=errors_conf["PAGE_SIZE"], type=int)
+
+    if (cursor and make_int(cursor) is None) or not 1 <= limit <= errors_conf["MAX_PAGE_SIZE"]:
+        return jsonify({
+            "Error": f"cursor must be a line number and limit must be from 1 to {errors_conf['MAX_PAGE_SIZE']}",
+        }), 400
+
+    try:
+        errors = handlers.handle_get_processing_errors(request_id, cursor=make_int(cursor), limit=limit)
+    except exceptions.NotFoundError:
+        return jsonify({"Error": "Request with the given ID was not found."}), 404
+
+    return jsonify(errors.dict())
+
+
 @bp.route("/resources/<uuid:resource_uuid>/", methods=["POST"])
 def post_image_for_resource(resource_uuid: str):
     """Router for posting images for resource with the given UUID."""
+    try:
+        handlers.check_upload_size(request.content_length, current_app.config["SCREENSHOTS"]["MAX_UPLOAD_SIZE"])
+    except exceptions.FileTooLargeError as e:
+        return jsonify({"Error": str(e)}), 413
 
     if request.files:
         try:
@@ -132,8 +200,14 @@ def post_image_for_resource(resource_uuid: str):
         except exceptions.NotFoundError:
             return jsonify({"Error": "Web resource with the givent UUID not found."}), 404
 
+        except exceptions.FileTooLargeError as e:
+            return jsonify({"Error": str(e)}), 413
+
+        except exceptions.InvalidFileError as e:
+            return jsonify({"Error": str(e)}), 400
+
         except ValidationError as e:
-            # app.logger.info(f""")
+            # current_app.logger.info(f""")
             errors = convert_to_serializable(e.errors())
             response = {
                 'error': 'Validation error',
@@ -148,23 +222,105 @@ def post_image_for_resource(resource_uuid: str):
 @bp.route("/resources/<uuid:resource_uuid>/", methods=["GET"])
 def get_resource_page(resource_uuid):
     try:
-        web_resource_data = handlers.handle_get_resource_data(resource_uuid)
+        web_resource_data = handlers.handle_get_resource_page_payload(resource_uuid)
     except exceptions.NotFoundError:
         return jsonify({"Error": "Resource with the given UUID not found."})
 
-    return jsonify(web_resource_data.dict())
+    return serializers.json_response(web_resource_data)
+
+
+@bp.route("/resources/<uuid:resource_uuid>/screenshot/", methods=["GET"])
+def get_resource_screenshot(resource_uuid):
+    """Return screenshot of the resource: `variant` thumbnail, medium or original (by default)."""
+    try:
+        return handlers.handle_get_screenshot(resource_uuid, variant=request.args.get("variant"))
+    except ValueError as e:
+        return jsonify({"Error": str(e)}), 400
+    except exceptions.NotFoundError:
+        return jsonify({"Error": "Screenshot of the resource with the given UUID not found."}), 404
+
+
+@bp.route("/resources/<uuid:resource_uuid>/latency/", methods=["GET"])
+def get_resource_latency(resource_uuid):
+    """Return p50, p95 and p99 of probe latency of the resource for the `window` (e.g. 7d or 2w)."""
+    latency_conf = current_app.config["CHECKER"]["LATENCY"]
+    try:
+        days = parse_window(
+            request.args.get("window"),
+            default_days=latency_conf["DEFAULT_WINDOW_DAYS"],
+            max_days=latency_conf["MAX_WINDOW_DAYS"],
+        )
+    except ValueError as e:
+        return jsonify({"Error": str(e)}), 400
+
+    try:
+        resource_latency = handlers.handle_get_resource_latency(resource_uuid, days=days)
+    except exceptions.NotFoundError:
+        return jsonify({"Error": "Resource with the given UUID not found."}), 404
+
+    return jsonify(resource_latency.dict())
+
+
+@bp.route("/check-runs/", methods=["GET"])
+def get_check_runs():
+    page = make_int(request.args.get('page', default=1, type=int))
+    per_page = make_int(request.args.get('per_page', default=10, type=int))
+
+    response = handlers.handle_get_check_runs(page=page, per_page=per_page)
+    return jsonify(response.dict())
+
+
+@bp.route("/check-runs/<int:run_id>/", methods=["GET"])
+def get_check_run(run_id: int):
+    try:
+        check_run = handlers.handle_get_check_run(run_id)
+    except exceptions.NotFoundError:
+        return jsonify({"Error": "Check run with the given ID was not found."}), 404
+
+    return jsonify(check_run.dict())
 
 
 @bp.route("/logs/", methods=["GET"])
 def get_logs():
+    """
+    Return last log records optionally filtered by minimal level.
+    Records are taken from the shared buffer, or read from the current and rotated log files
+    when time range (`since`, `until`) or text (`q`) is given or `limit` exceeds the buffer size.
+    """
+    logging_conf = current_app.config["LOGGING"]
+    limit = make_int(request.args.get("limit")) or logging_conf["BUFFER"]["SHOWN_DEFAULT"]
+    limit = min(limit, logging_conf["FILE"]["SEARCH"]["MAX_LIMIT"])
+    text = request.args.get("q")
+
+    try:
+        min_level = parse_level(request.args.get("level"))
+        since = parse_datetime(request.args.get("since"))
+        until = parse_datetime(request.args.get("until"))
+    except ValueError as e:
+        return jsonify({"Error": str(e)}), 400
+
+    if since or until or text:
+        logs = current_app.extensions["log_searcher"].search(
+            since=since,
+            until=until,
+            min_level=min_level,
+            text=text,
+            limit=limit,
+        )
+    elif limit > logging_conf["BUFFER"]["MAX_SIZE"]:
+        logs = current_app.extensions["log_searcher"].tail(count=limit, min_level=min_level)
+    else:
+        logs = current_app.extensions["log_buffer"].last(count=limit, min_level=min_level)
+
     log_response = schemas.LogListGetSchema(
-        logs=[schemas.LogRecordSchema(**log) for log in log_buffer]
+        logs=[schemas.LogRecordSchema(**log) for log in logs]
     )
     return jsonify(log_response.dict())
 
 
 @socketio.on("connect", namespace="/logs")
 def connect():
-    # app.logger.info("Websocket connection to /logs page")
-    logs = log_buffer
-    socketio.emit(event="init_logs", data={"logs": logs}, namespace="/logs")
+    # current_app.logger.info("Websocket connection to /logs page")
+    logs = current_app.extensions["log_buffer"].last(count=current_app.config["LOGGING"]["WS"]["SHOWED_COUNT"])
+    # only to the connecting client, the others already have these records
+    socketio.emit(event="init_logs", data={"logs": logs}, namespace="/logs", to=request.sid)
@@ -1,5 +1,7 @@
+import atexit
 import logging
 import os
+import queue
 from logging.handlers import RotatingFileHandler
 from pathlib import Path
 
@@ -12,17 +14,62 @@ from flask_sqlalchemy import SQLAlchemy
 from redis import Redis
 from werkzeug.routing import IntegerConverter, UUIDConverter
 
-from main import log_buffer, socketio
-from main.logger import LogBufferHandler, WebSocketHandler
+from main import bp, socketio, views
+from main.cli import init_cli
+from main.logger import (BatchingQueueListener, DroppingQueueHandler,
+                         LogBufferHandler, MemoryLogBuffer, RedisLogBuffer,
+                         WebSocketHandler)
+from main.metrics import init_metrics
+from main.profiler import init_profiler
+from main.replica import REPLICA_BIND, init_replica, replica_database_uri
+from main.utils.logsearch import LogFileSearcher
 
 db = SQLAlchemy()
 
+# Socket.IO async mode for every web worker class (WEB_WORKER_CLASS), see gunicorn.conf.py
+SOCKETIO_ASYNC_MODES = {"gthread": "threading", "eventlet": "eventlet", "gevent": "gevent"}
+
+# celery tasks are routed to named queues, so every workload is consumed by its own workers
+# (see worker profiles in local.mk and docker-compose.yaml, prefetch multiplier is set per worker)
+CELERY_QUEUES = {
+    # check runs are resumed from checkpoints and claims expire, so tasks are acknowledged on receipt
+    "checker": {
+        "tasks": [
+            "main.tasks.get_response_from_resources",
+            "main.tasks.check_resources",
+            "main.tasks.schedule_due_checks",
+        ],
+        "acks_late": False,
+    },
+    # tasks of a lost worker are redelivered instead of being dropped: URLs and errors are inserted
+    # skipping existing rows, chunk counters and the chord dispatch are recorded once (see ProcessingProgress)
+    "ingestion": {
+        "tasks": [
+            "main.tasks.process_urls_from_zip_archive",
+            "main.tasks.process_urls_chunk",
+            "main.tasks.finish_processing_request",
+            "main.tasks.fail_processing_request",
+            "main.tasks.make_screenshot_variants",
+        ],
+        "acks_late": True,
+    },
+    "maintenance": {
+        "tasks": [
+            "main.tasks.delete_unavailable_resources",
+        ],
+        "acks_late": True,
+    },
+}
+
 BASE_PATH = Path(__file__).resolve().parent.parent
 load_dotenv(os.path.join(BASE_PATH, ".env"))
 
 
-def create_app(conf_file: str = "config.yaml"):
-    """Creating app factory."""
+def create_worker_app(conf_file: str = "config.yaml"):
+    """
+    Creating app factory with config, DB, Redis, logging and Celery only.
+    Used by celery workers and flask CLI that don't need routes and socketio.
+    """
     app = Flask(__name__)
 
     if not os.path.isabs(conf_file):
@@ -42,15 +89,26 @@ def create_app(conf_file: str = "config.yaml"):
         os.getenv('POSTGRES_DB', 'flask')
     )
 
-    SECRET_KEY = os.urandom(12).hex()
-    app.config['SECRET_KEY'] = SECRET_KEY
+    # optional read replica for read-only queries
+    replica_uri = replica_database_uri()
+    if replica_uri:
+        app.config['SQLALCHEMY_BINDS'] = {REPLICA_BIND: replica_uri}
+
+    # must be the same in all web workers, otherwise sessions and CSRF tokens of forms break between them
+    app.config['SECRET_KEY'] = os.getenv('SECRET_KEY') or os.urandom(12).hex()
+    # value of `PROFILING.HEADER` that enables profiling of a request, not set - the header is ignored
+    app.config['PROFILING_SECRET'] = os.getenv('PROFILING_SECRET')
 
     db.init_app(app)
+    init_replica(app)
     migrate = Migrate(app=app, db=db)
 
     app.url_map.converters['int'] = IntegerConverter
     app.url_map.converters['uuid'] = UUIDConverter
 
+    redis_client = Redis(host=os.getenv("BROKER_URL_HOST"), port=6379)
+    app.extensions["redis"] = redis_client
+
     configure_logging(app=app)
 
     app.config.from_mapping(
@@ -59,16 +117,76 @@ def create_app(conf_file: str = "config.yaml"):
             result_backend="redis://{}:6379".format(os.getenv("RESULT_BACKEND_HOST")),
             task_ignore_result=True,
             broker_connection_retry_on_startup=True,
+            task_routes={
+                task: {"queue": queue}
+                for queue, queue_conf in CELERY_QUEUES.items()
+                for task in queue_conf["tasks"]
+            },
+            task_annotations={
+                task: {"acks_late": queue_conf["acks_late"], "reject_on_worker_lost": queue_conf["acks_late"]}
+                for queue_conf in CELERY_QUEUES.values()
+                for task in queue_conf["tasks"]
+            },
         ),
     )
 
-    redis_client = Redis(host=os.getenv("BROKER_URL_HOST"), port=6379)
-    app.extensions["redis"] = redis_client
-
     celery_init_app(app)
+    init_metrics(app)
+    init_profiler(app)
+    init_cli(app)
+    return app
+
+
+def create_app(conf_file: str = "config.yaml"):
+    """Creating web app factory: worker app with routes, realtime logs and socketio."""
+    app = create_worker_app(conf_file)
+
+    # add websocket handler for realtime logs monitoring
+    _add_ws_handler(app, socketio, app.config["LOGGING"]["WS"])
+
+    # views are registered on blueprints at import
+    from main import routes  # noqa: F401
+    from main.api import routes as api_routes  # noqa: F401
+
+    app.register_blueprint(blueprint=views)
+    app.register_blueprint(blueprint=bp)
+
+    worker_class = os.getenv("WEB_WORKER_CLASS", "gthread")
+    if worker_class not in SOCKETIO_ASYNC_MODES:
+        raise ValueError(f"Unknown WEB_WORKER_CLASS: {worker_class}, expected one of {', '.join(SOCKETIO_ASYNC_MODES)}")
+
+    socketio.init_app(
+        app,
+        async_mode=SOCKETIO_ASYNC_MODES[worker_class],
+        # events emitted by any web worker (or process) reach clients connected to all of them
+        message_queue="redis://{}:6379".format(os.getenv("BROKER_URL_HOST")),
+    )
+
+    if not os.getenv("SECRET_KEY"):
+        app.logger.warning("SECRET_KEY is not set, a random key is used, so sessions differ between web workers")
+
+    app.logger.info("app started")
     return app
 
 
+def reinit_after_fork(app: Flask) -> None:
+    """
+    Recreate process-bound resources of an app created before fork (gunicorn `preload_app`):
+    DB connection pools, the log delivery thread and the Socket.IO message queue listener.
+    """
+    with app.app_context():
+        for engine in app.extensions["sqlalchemy"].engines.values():
+            # connections of the parent are left to it, the pool of this process starts empty
+            engine.dispose(close=False)
+
+    listener = app.extensions.get("ws_log_listener")
+    if listener is not None:
+        listener.start()
+
+    # pubsub listener of the message queue is started on first use in this process
+    socketio.server.manager_initialized = False
+
+
 def celery_init_app(app: Flask) -> Celery:
     """Initialize celery app."""
     class FlaskTask(Task):
@@ -100,10 +218,6 @@ def configure_logging(app):
     buffer_conf = logging_conf["BUFFER"]
     _add_buffer_handler(app, buffer_conf)
 
-    # add websocket handler for realtime logs monitoring
-    ws_conf = logging_conf["WS"]
-    _add_ws_handler(app, socketio, ws_conf)
-
 
 def _add_file_handler(app, conf: dict):
     """Add rotation file log handler."""
@@ -119,32 +233,78 @@ def _add_file_handler(app, conf: dict):
 
     app.logger.addHandler(handler)
 
+    # searcher over the current and rotated files for the log query API
+    search_conf = conf["SEARCH"]
+    app.extensions["log_searcher"] = LogFileSearcher(
+        base_filename=handler.baseFilename,
+        backup_count=handler.backupCount,
+        index_dir=search_conf["INDEX_DIR"],
+        index_step=search_conf["INDEX_STEP"],
+    )
+
 
 def _add_buffer_handler(app, conf):
     """Set buffer handler that store all new logs."""
     formatter_conf = conf["FORMATTER"]
     level = conf["LEVEL"]
-    max_size = conf["SHOWN_DEFAULT"]
+    max_size = conf["MAX_SIZE"]
+
+    # redis stream is shared by web and celery processes, deque is private to the process
+    if conf["BACKEND"] == "redis":
+        log_buffer = RedisLogBuffer(
+            redis_client=app.extensions["redis"],
+            key=conf["STREAM_KEY"],
+            max_size=max_size,
+        )
+    else:
+        log_buffer = MemoryLogBuffer(max_size=max_size)
+
+    app.extensions["log_buffer"] = log_buffer
 
-    # use common dynamic list for buffer
-    handler = LogBufferHandler(buffer_obj=log_buffer, max_size=max_size)
+    handler = LogBufferHandler(buffer_obj=log_buffer)
     handler.setLevel(level)
 
     formatter = logging.Formatter(**formatter_conf)
     handler.setFormatter(formatter)
 
+    app.extensions["log_buffer_handler"] = handler
     app.logger.addHandler(handler)
 
 
 def _add_ws_handler(app, socket_obj, conf):
-    """Set handler for realtime notification via websocket connection to all connected clients."""
+    """
+    Set handler for realtime notification via websocket connection to all connected clients.
+    Records are put in a bounded queue and delivered in batches by a background listener,
+    so logging never waits for socket clients.
+    """
     formatter_conf = conf["FORMATTER"]
     event_name = conf["EVENT_NAME"]
     namespace = conf["NAMESPACE"]
     level = conf["LEVEL"]
 
-    handler = WebSocketHandler(socket_obj, event_name, level=level, namespace=namespace)
+    queue_handler = DroppingQueueHandler(queue.Queue(maxsize=conf["QUEUE_SIZE"]))
+    queue_handler.setLevel(level)
+
+    handler = WebSocketHandler(
+        socket_obj,
+        event_name,
+        level=level,
+        namespace=namespace,
+        max_batch_size=conf["MAX_BATCH_SIZE"],
+        max_pending=conf["QUEUE_SIZE"],
+        queue_handler=queue_handler,
+    )
     formatter = logging.Formatter(**formatter_conf)
     handler.setFormatter(formatter)
 
-    app.logger.addHandler(handler)
+    listener = BatchingQueueListener(
+        queue_handler.queue,
+        handler,
+        flush_interval=conf["FLUSH_INTERVAL"],
+    )
+    listener.start()
+    atexit.register(listener.stop)
+
+    app.extensions["ws_log_queue_handler"] = queue_handler
+    app.extensions["ws_log_listener"] = listener
+    app.logger.addHandler(queue_handler)
@@ -0,0 +1,27 @@
+"""
+Maintenance commands of the flask CLI, e.g. `flask screenshots backfill`.
+
+Service modules import `main.app`, so they are imported inside commands.
+"""
+import click
+from flask import Flask, current_app
+from flask.cli import AppGroup
+
+screenshots_cli = AppGroup("screenshots", help="Screenshot variants.")
+
+
+@screenshots_cli.command("backfill")
+def backfill_screenshot_variants():
+    """Queue making of variants of screenshots that have none (or outdated ones) for `SCREENSHOTS.VARIANTS`."""
+    from main.service import db
+    from main.tasks import make_screenshot_variants
+
+    resource_ids = db.get_resource_ids_missing_screenshot_variants(list(current_app.config["SCREENSHOTS"]["VARIANTS"]))
+    for resource_id in resource_ids:
+        make_screenshot_variants.delay(resource_id)
+
+    click.echo(f"Queued variants of {len(resource_ids)} screenshots")
+
+
+def init_cli(app: Flask) -> None:
+    app.cli.add_command(screenshots_cli)
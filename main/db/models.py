@@ -5,7 +5,6 @@ from typing import List, TypedDict
 from sqlalchemy.dialects.postgresql import JSON, UUID
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
-from sqlalchemy.types import ARRAY
 
 from main.app import db
 
@@ -41,21 +40,53 @@ class WebResource(db.Model):
     url_path = db.Column(db.String)
     query_params = db.Column(JSON)
     unavailable_count = db.Column(db.Integer, default=0)
-    screenshot = db.Column(db.LargeBinary, nullable=True)
+    screenshot = db.Column(db.LargeBinary, nullable=True)  # original, pages use its variants
+    screenshot_mimetype = db.Column(db.String, nullable=True)
+    screenshot_updated_at = db.Column(db.DateTime(timezone=True), nullable=True)
+    next_check_at = db.Column(db.DateTime(timezone=True), server_default=func.now(), index=True)
+    check_interval = db.Column(db.Integer, nullable=True)  # seconds, adapted after every check
     status_codes = relationship("WebResourceStatus", back_populates="resource")
     news_feed_items = relationship("NewsFeedItem", back_populates="resource")
 
 
 class WebResourceStatus(db.Model):
     """Model for statuses of Web resources."""
+    __table_args__ = (
+        # latest status of a resource
+        db.Index("ix_web_resource_status_resource_id_request_time", "resource_id", "request_time"),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     resource_id = db.Column(db.Integer, db.ForeignKey(WebResource.id))
     status_code = db.Column(db.Integer, nullable=True)
     request_time = db.Column(db.DateTime(timezone=True), server_default=func.now())
     is_available = db.Column(db.Boolean)
+    ttfb_ms = db.Column(db.Integer, nullable=True)  # time to the first byte of response
+    total_ms = db.Column(db.Integer, nullable=True)  # time of the whole probe
     resource = relationship("WebResource", back_populates="status_codes", lazy="joined")
 
 
+class ResourceLatencyBucket(db.Model):
+    """Model for daily log-scale histograms of probe latency per resource: probe count in each bucket."""
+    resource_id = db.Column(db.Integer, db.ForeignKey(WebResource.id, ondelete="CASCADE"), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    metric = db.Column(db.String(8), primary_key=True)  # ttfb or total
+    bucket = db.Column(db.SmallInteger, primary_key=True)
+    probes = db.Column(db.Integer, nullable=False, default=0)
+
+
+class ScreenshotVariant(db.Model):
+    """Model for resized and recompressed copies of resource screenshots."""
+    resource_id = db.Column(db.Integer, db.ForeignKey(WebResource.id, ondelete="CASCADE"), primary_key=True)
+    name = db.Column(db.String(16), primary_key=True)  # thumbnail, medium
+    mimetype = db.Column(db.String, nullable=False)
+    width = db.Column(db.Integer, nullable=False)
+    height = db.Column(db.Integer, nullable=False)
+    content = db.Column(db.LargeBinary, nullable=False)
+    # `screenshot_updated_at` of the original the variant was made from
+    source_updated_at = db.Column(db.DateTime(timezone=True), nullable=False)
+
+
 class FileProcessingRequest(db.Model):
     """Model for requests for processing URLs from file. Tracked by Celery."""
     id = db.Column(db.Integer, primary_key=True)
@@ -64,7 +95,19 @@ class FileProcessingRequest(db.Model):
     total_count = db.Column(db.Integer, nullable=True, default=None)
     processed_count = db.Column(db.Integer, nullable=True, default=None)
     errors_count = db.Column(db.Integer, nullable=True, default=None)
-    error_urls = db.Column(ARRAY(db.String), default=[])
+    content_hash = db.Column(db.String(64), nullable=True, index=True)  # SHA-256 of the uploaded archive
+    size_bytes = db.Column(db.BigInteger, nullable=True)
+    created_at = db.Column(db.DateTime(timezone=True), server_default=func.now())
+
+
+class FileProcessingError(db.Model):
+    """Model for invalid lines of files processed by file processing requests."""
+    request_id = db.Column(
+        db.Integer, db.ForeignKey(FileProcessingRequest.id, ondelete="CASCADE"), primary_key=True,
+    )
+    line_number = db.Column(db.Integer, primary_key=True)  # numbering continues across CSV files of archive
+    line = db.Column(db.String, nullable=False)
+    reason = db.Column(db.String(64), nullable=False)  # type of validation error, e.g. value_error.url.scheme
 
 
 class NewsFeedItem(db.Model):
@@ -74,3 +117,20 @@ class NewsFeedItem(db.Model):
     resource_id = db.Column(db.Integer, db.ForeignKey(WebResource.id))
     resource = relationship("WebResource", back_populates="news_feed_items")
     timestamp = db.Column(db.DateTime(timezone=True), server_default=func.now())
+
+
+class CheckRun(db.Model):
+    """Model for checker runs over all resources, checkpointed so that an interrupted run is resumed."""
+    id = db.Column(db.Integer, primary_key=True)
+    status = db.Column(db.Enum(StatusOption), default=StatusOption.INPROCESS, nullable=False, index=True)
+    started_at = db.Column(db.DateTime(timezone=True), server_default=func.now())
+    updated_at = db.Column(db.DateTime(timezone=True), server_default=func.now())  # last checkpoint
+    finished_at = db.Column(db.DateTime(timezone=True), nullable=True)
+    last_resource_id = db.Column(db.Integer, nullable=True)  # resources are checked in the order of IDs
+    total_count = db.Column(db.Integer, nullable=True)
+    checked_count = db.Column(db.Integer, default=0, nullable=False)
+    timeouts_count = db.Column(db.Integer, default=0, nullable=False)
+    fast_failed_count = db.Column(db.Integer, default=0, nullable=False)
+    bytes_received = db.Column(db.BigInteger, default=0, nullable=False)
+    elapsed_seconds = db.Column(db.Float, default=0, nullable=False)  # time spent checking, without pauses
+    resumed_count = db.Column(db.Integer, default=0, nullable=False)
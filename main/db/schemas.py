@@ -1,6 +1,6 @@
-from base64 import b64encode
 from datetime import datetime
-from typing import List, Optional
+from enum import Enum
+from typing import Dict, List, Optional
 
 from pydantic import UUID4, AnyHttpUrl, BaseModel, root_validator, validator
 from werkzeug.datastructures import FileStorage
@@ -30,14 +30,7 @@ class ListResourceGetSchemaItem(ResourceCreateResponseSchema):
 
 
 class ResourceGetSchema(ListResourceGetSchemaItem):
-    screenshot: Optional[str]
-
-    @root_validator(pre=True)
-    def convert_bytes_to_base64(cls, values):
-        screenshot = values.get("screenshot")
-        if screenshot is not None and isinstance(screenshot, bytes):
-            values["screenshot"] = b64encode(screenshot).decode("utf-8")
-        return values
+    screenshot_urls: Optional[Dict[str, str]]  # variant name: URL, None if there is no screenshot
 
 
 class ListResourceGetSchema(BaseModel):
@@ -98,3 +91,67 @@ class LogRecordSchema(BaseModel):
 
 class LogListGetSchema(BaseModel):
     logs: List[LogRecordSchema]
+
+
+class ProcessingErrorSchema(BaseModel):
+    line_number: int
+    line: str
+    reason: str
+
+
+class ProcessingErrorListSchema(BaseModel):
+    items: List[ProcessingErrorSchema]
+    next_cursor: Optional[int]  # line number to pass as `cursor` for the next page, None on the last page
+    links: dict
+
+
+class CheckRunSchema(BaseModel):
+    id: int
+    status: str
+    started_at: datetime
+    updated_at: datetime
+    finished_at: Optional[datetime]
+    last_resource_id: Optional[int]
+    total_count: Optional[int]
+    checked_count: int
+    timeouts_count: int
+    fast_failed_count: int
+    bytes_received: int
+    elapsed_seconds: float
+    resumed_count: int
+    progress: Optional[float]
+    resources_per_second: Optional[float]
+
+    @root_validator(pre=True)
+    def compute_progress(cls, values):
+        values = dict(values)
+        status = values.get("status")
+        if isinstance(status, Enum):
+            values["status"] = status.value
+
+        total_count = values.get("total_count")
+        checked_count = values.get("checked_count") or 0
+        elapsed_seconds = values.get("elapsed_seconds") or 0
+        values["progress"] = min(checked_count / total_count, 1.0) if total_count else None
+        values["resources_per_second"] = checked_count / elapsed_seconds if elapsed_seconds else None
+        return values
+
+
+class PaginatedCheckRunListSchema(BaseModel):
+    items: List[CheckRunSchema]
+    meta: dict
+    links: dict
+
+
+class LatencyPercentilesSchema(BaseModel):
+    probes: int
+    p50: Optional[float]
+    p95: Optional[float]
+    p99: Optional[float]
+
+
+class ResourceLatencySchema(BaseModel):
+    uuid: UUID4
+    window_days: int
+    ttfb_ms: LatencyPercentilesSchema
+    total_ms: LatencyPercentilesSchema
@@ -1,35 +1,280 @@
 import logging
+import queue
+import threading
+import time
+from collections import deque
+from logging.handlers import QueueHandler, QueueListener
+from typing import Deque, List, Optional
 
 from flask_socketio import SocketIO
+from redis import Redis, RedisError
 
 
 class WebSocketHandler(logging.Handler):
-    def __init__(self, socket_obj: SocketIO, event_name, namespace, *args, **kwargs):
+    """
+    Collect formatted records and send them to connected clients in batches.
+    Records are only accumulated in `emit`, delivery happens in `flush` which is called
+    periodically by `BatchingQueueListener` outside of the request path.
+    At most `max_pending` records wait for delivery, the rest are dropped and counted together
+    with the drops of `queue_handler`; each flush reports the drops since the previous one.
+    """
+
+    def __init__(
+        self,
+        socket_obj: SocketIO,
+        event_name: str,
+        namespace: str,
+        max_batch_size: int,
+        max_pending: int,
+        queue_handler: Optional["DroppingQueueHandler"] = None,
+        *args,
+        **kwargs,
+    ):
         super().__init__(*args, **kwargs)
         self.socket_obj = socket_obj
         self.event_name = event_name
         self.namespace = namespace
+        self.max_batch_size = max_batch_size
+        self.max_pending = max_pending
+        self.queue_handler = queue_handler
+        self._pending: List[dict] = []
+        self._dropped = 0
 
     def emit(self, record: logging.LogRecord):
-        self.socket_obj.emit(
-            event="new_log",
-            data={
-                "message": self.formatter.format(record),
+        # called under the handler lock, as is the swap of pending records in `flush`
+        if len(self._pending) >= self.max_pending:
+            if self.queue_handler:
+                self.queue_handler.count_dropped()
+            else:
+                self._dropped += 1
+            return
+
+        self._pending.append(
+            {
+                "message": self.format(record),
                 "level": record.levelname
-            },
-            namespace="/logs"
+            }
         )
 
+    def flush(self):
+        self.acquire()
+        try:
+            pending, self._pending = self._pending, []
+            dropped, self._dropped = self._dropped, 0
+        finally:
+            self.release()
+
+        if self.queue_handler:
+            dropped += self.queue_handler.take_dropped()
+
+        # drops are reported even when nothing else is sent, and only once
+        for start in range(0, max(len(pending), 1 if dropped else 0), self.max_batch_size):
+            self.socket_obj.emit(
+                event=self.event_name,
+                data={
+                    "logs": pending[start:start + self.max_batch_size],
+                    "dropped": dropped,
+                },
+                namespace=f"/{self.namespace}",
+            )
+            dropped = 0
+
+
+class DroppingQueueHandler(QueueHandler):
+    """QueueHandler that never blocks the caller: records are dropped and counted when the queue is full."""
+
+    def __init__(self, queue_obj: queue.Queue):
+        super().__init__(queue_obj)
+        # total since start, `take_dropped` returns the part not taken yet
+        self.dropped = 0
+        self._taken = 0
+        self._dropped_lock = threading.Lock()
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.count_dropped()
+
+    def count_dropped(self, count: int = 1) -> None:
+        with self._dropped_lock:
+            self.dropped += count
+
+    def take_dropped(self) -> int:
+        """Number of records dropped since the previous call."""
+        with self._dropped_lock:
+            dropped, self._taken = self.dropped - self._taken, self.dropped
+        return dropped
+
+
+class BatchingQueueListener(QueueListener):
+    """QueueListener that flushes its handlers at a fixed cadence instead of after every record."""
+
+    def __init__(self, queue_obj: queue.Queue, *handlers, flush_interval: float, respect_handler_level=True):
+        super().__init__(queue_obj, *handlers, respect_handler_level=respect_handler_level)
+        self.flush_interval = flush_interval
+
+    def _flush_handlers(self) -> None:
+        for handler in self.handlers:
+            try:
+                handler.flush()
+            except Exception:
+                # delivery problems must not kill the listener thread
+                pass
+
+    def _monitor(self):
+        q = self.queue
+        has_task_done = hasattr(q, "task_done")
+        next_flush = time.monotonic() + self.flush_interval
+
+        while True:
+            timeout = next_flush - time.monotonic()
+            if timeout <= 0:
+                self._flush_handlers()
+                next_flush = time.monotonic() + self.flush_interval
+                continue
+
+            try:
+                record = q.get(timeout=timeout)
+            except queue.Empty:
+                continue
+
+            if record is self._sentinel:
+                self._flush_handlers()
+                if has_task_done:
+                    q.task_done()
+                break
+
+            self.handle(record)
+            if has_task_done:
+                q.task_done()
+
+
+class MemoryLogBuffer:
+    """Bounded in-process ring buffer of log entries."""
+
+    def __init__(self, max_size: int):
+        self.entries: Deque[dict] = deque(maxlen=max_size)
+
+    def append(self, entry: dict) -> None:
+        self.entries.append(entry)
+
+    def last(self, count: int, min_level: int = logging.NOTSET) -> List[dict]:
+        """Return up to `count` newest entries with level >= `min_level` in chronological order."""
+        result = []
+        for entry in reversed(self.entries):
+            if len(result) >= count:
+                break
+            if entry["levelno"] >= min_level:
+                result.append(entry)
+        result.reverse()
+        return [dict(level=entry["level"], message=entry["message"]) for entry in result]
+
+
+class RedisLogBuffer:
+    """
+    Bounded ring buffer of log entries backed by a capped Redis stream.
+    The stream is shared by all web and celery processes. While Redis is unreachable
+    entries go to the in-process fallback buffer.
+    """
+
+    # seconds to wait before trying Redis again after a failure
+    RETRY_AFTER = 5
+    # entries fetched per XREVRANGE call while filtering by level
+    READ_BATCH = 200
+
+    def __init__(self, redis_client: Redis, key: str, max_size: int):
+        self.redis_client = redis_client
+        self.key = key
+        self.max_size = max_size
+        self.fallback = MemoryLogBuffer(max_size=max_size)
+        self._retry_at = 0.0
+
+    def _is_available(self) -> bool:
+        return time.monotonic() >= self._retry_at
+
+    def _mark_failed(self) -> None:
+        self._retry_at = time.monotonic() + self.RETRY_AFTER
+
+    def append(self, entry: dict) -> None:
+        if self._is_available():
+            try:
+                self.redis_client.xadd(
+                    name=self.key,
+                    fields=entry,
+                    maxlen=self.max_size,
+                    approximate=True,
+                )
+                return
+            except RedisError:
+                self._mark_failed()
+
+        self.fallback.append(entry)
+
+    def last(self, count: int, min_level: int = logging.NOTSET) -> List[dict]:
+        """Return up to `count` newest entries with level >= `min_level` in chronological order."""
+        if not self._is_available():
+            return self.fallback.last(count, min_level)
+
+        result = []
+        upper_bound = "+"
+
+        try:
+            while len(result) < count:
+                batch = self.redis_client.xrevrange(
+                    name=self.key,
+                    max=upper_bound,
+                    min="-",
+                    count=self.READ_BATCH if min_level else count - len(result),
+                )
+                if not batch:
+                    break
+
+                for entry_id, fields in batch:
+                    if int(fields[b"levelno"]) >= min_level:
+                        result.append(dict(
+                            level=fields[b"level"].decode("utf-8"),
+                            message=fields[b"message"].decode("utf-8"),
+                        ))
+                        if len(result) >= count:
+                            break
+
+                # continue right before the oldest entry of the batch (exclusive range)
+                upper_bound = "(" + batch[-1][0].decode("utf-8")
+
+        except RedisError:
+            self._mark_failed()
+            return self.fallback.last(count, min_level)
+
+        result.reverse()
+        return result
+
 
 class LogBufferHandler(logging.Handler):
-    def __init__(self, buffer_obj, max_size, *args, **kwargs):
+    def __init__(self, buffer_obj, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.buffer_obj = buffer_obj
-        self.size = max_size
 
     def emit(self, record: logging.LogRecord) -> None:
-        if len(self.buffer_obj) >= self.size:
-            self.buffer_obj.pop(-1)
         self.buffer_obj.append(
-            dict(level=record.levelname, message=self.formatter.format(record))
+            dict(
+                level=record.levelname,
+                levelno=record.levelno,
+                message=self.formatter.format(record),
+            )
         )
+
+
+def parse_level(level: Optional[str]) -> int:
+    """Convert level name (or number) from query params to logging level number."""
+    if not level:
+        return logging.NOTSET
+
+    if level.isdigit():
+        return int(level)
+
+    level_number = logging.getLevelName(level.upper())
+    if not isinstance(level_number, int):
+        raise ValueError(f"Unknown logging level: {level}")
+
+    return level_number
@@ -1,24 +1,47 @@
+import logging
+
 from celery import Celery
 from celery.schedules import crontab
+from celery.signals import (after_setup_logger, after_setup_task_logger,
+                            worker_ready)
 from flask import Flask
 
-from main import create_app
-from main.tasks import delete_unavailable_resources, get_response_from_resources
+from main import create_worker_app
+from main.service import db
+from main.tasks import (delete_unavailable_resources,
+                        get_response_from_resources, schedule_due_checks)
 
-flask_app: Flask = create_app()
+flask_app: Flask = create_worker_app()
 celery: Celery = flask_app.extensions["celery"]
 
 
+@after_setup_logger.connect
+@after_setup_task_logger.connect
+def setup_log_buffer(logger: logging.Logger, **kwargs):
+    """Mirror celery worker and task logs to the log buffer shared with the web app."""
+    if logger is logging.getLogger():
+        # app logger already propagates to the root logger, so attach to celery loggers only
+        logger = logging.getLogger("celery")
+    logger.addHandler(flask_app.extensions["log_buffer_handler"])
+
+
+@worker_ready.connect
+def resume_check_run(**kwargs):
+    """Resume a check run interrupted by the worker restart once it is considered stale."""
+    with flask_app.app_context():
+        if db.has_unfinished_check_run():
+            get_response_from_resources.apply_async(
+                countdown=flask_app.config["CHECKER"]["RUNS"]["STALE_AFTER"],
+            )
+
+
 @celery.on_after_configure.connect
 def setup_periodic_making_requests(sender: Celery, **kwargs):
-    """Add periodic task for getting responses from all resources from DB and deleting unavailable ones."""
+    """Add periodic tasks for scheduling checks of due resources and deleting unavailable ones."""
     sender.add_periodic_task(
-        schedule=crontab(
-            minute="0",
-            hour=flask_app.config["PERIODIC_TASKS"]["GET_RESPONSES_FROM_URLS"]["RUN_SCHEDULE_HOUR"]
-        ),
-        sig=get_response_from_resources,
-        name="get_response_from_resources",
+        schedule=flask_app.config["PERIODIC_TASKS"]["SCHEDULE_CHECKS"]["TICK_SECONDS"],
+        sig=schedule_due_checks,
+        name="schedule_due_checks",
     )
 
     sender.add_periodic_task(
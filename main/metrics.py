@@ -0,0 +1,361 @@
+"""
+Prometheus metrics aggregated across web and celery processes through Redis.
+
+Every process accumulates increments locally and flushes them to Redis hashes (one hash per metric,
+one field per sample) after requests and tasks, from a background thread every `flush_interval`
+seconds while the process is idle and on exit, so `/metrics` of any web process returns totals
+of all processes. Hash fields are Prometheus sample names with labels, e.g.
+`http_request_duration_seconds_bucket{endpoint="views.index",le="0.1"}`.
+"""
+import atexit
+import math
+import os
+import re
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from celery.signals import task_postrun, task_prerun, worker_process_shutdown
+from flask import Flask, g, has_app_context, request
+from redis import Redis, RedisError
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+LE_RE = re.compile(r'le="([^"]+)"')
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_float(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf"
+    return repr(float(value))
+
+
+def _sample_name(name: str, labels: Iterable[Tuple[str, str]]) -> str:
+    labels_str = ",".join(f'{key}="{_escape(value)}"' for key, value in labels)
+    return f"{name}{{{labels_str}}}" if labels_str else name
+
+
+class Metric:
+    type_name = ""
+
+    def __init__(self, registry: "MetricsRegistry", name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def _labels(self, labels: dict) -> List[Tuple[str, str]]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"Metric {self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return [(key, labels[key]) for key in self.labelnames]
+
+
+class Counter(Metric):
+    type_name = "counter"
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        self.registry.increment(self.name, _sample_name(self.name, self._labels(labels)), amount)
+
+
+class Gauge(Metric):
+    type_name = "gauge"
+
+    def set(self, value: float, **labels) -> None:
+        self.registry.set(self.name, _sample_name(self.name, self._labels(labels)), value)
+
+
+class Histogram(Metric):
+    type_name = "histogram"
+
+    def __init__(self, *args, buckets: Sequence[float] = DEFAULT_BUCKETS, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value: float, **labels) -> None:
+        label_list = self._labels(labels)
+        for bound in self.buckets:
+            if value <= bound:
+                self.registry.increment(
+                    self.name,
+                    _sample_name(f"{self.name}_bucket", label_list + [("le", _format_float(bound))]),
+                    1,
+                )
+        self.registry.increment(self.name, _sample_name(f"{self.name}_sum", label_list), value)
+        self.registry.increment(self.name, _sample_name(f"{self.name}_count", label_list), 1)
+
+
+class MetricsRegistry:
+    """Metric definitions and process-local pending values flushed to Redis."""
+
+    def __init__(self):
+        self.metrics: Dict[str, Metric] = {}
+        self.redis_client: Optional[Redis] = None
+        self.key_prefix = "metrics"
+        self.flush_interval = 5.0
+        self._increments: Dict[Tuple[str, str], float] = {}
+        self._values: Dict[Tuple[str, str], float] = {}
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+        self._flusher_pid: Optional[int] = None
+
+    def _ensure_flusher(self) -> None:
+        """Start the background flush thread once per process (threads don't survive fork)."""
+        if self._flusher_pid == os.getpid() or self.redis_client is None:
+            return
+        with self._lock:
+            if self._flusher_pid == os.getpid():
+                return
+            self._flusher_pid = os.getpid()
+        threading.Thread(target=self._flush_periodically, name="metrics-flusher", daemon=True).start()
+
+    def _flush_periodically(self) -> None:
+        while True:
+            time.sleep(self.flush_interval)
+            self.flush_if_due()
+
+    def _register(self, metric: Metric) -> Metric:
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(self, name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(self, name, documentation, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return self._register(Histogram(self, name, documentation, labelnames, buckets=buckets))
+
+    def increment(self, metric_name: str, sample: str, amount: float) -> None:
+        self._ensure_flusher()
+        with self._lock:
+            key = (metric_name, sample)
+            self._increments[key] = self._increments.get(key, 0) + amount
+
+    def set(self, metric_name: str, sample: str, value: float) -> None:
+        self._ensure_flusher()
+        with self._lock:
+            self._values[(metric_name, sample)] = value
+
+    def _key(self, metric_name: str) -> str:
+        return f"{self.key_prefix}:{metric_name}"
+
+    def flush(self) -> None:
+        """Send pending values to Redis in one round trip."""
+        with self._lock:
+            increments, self._increments = self._increments, {}
+            values, self._values = self._values, {}
+            self._last_flush = time.monotonic()
+
+        if self.redis_client is None or not (increments or values):
+            return
+
+        pipeline = self.redis_client.pipeline(transaction=False)
+        for (metric_name, sample), amount in increments.items():
+            pipeline.hincrbyfloat(self._key(metric_name), sample, amount)
+        for (metric_name, sample), value in values.items():
+            pipeline.hset(self._key(metric_name), sample, value)
+
+        try:
+            pipeline.execute()
+        except RedisError:
+            # keep pending values until the next flush
+            with self._lock:
+                for key, amount in increments.items():
+                    self._increments[key] = self._increments.get(key, 0) + amount
+                for key, value in values.items():
+                    self._values.setdefault(key, value)
+
+    def flush_if_due(self) -> None:
+        if time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def render(self) -> str:
+        """Render all metrics aggregated in Redis in Prometheus text exposition format."""
+        self.flush()
+
+        pipeline = self.redis_client.pipeline(transaction=False)
+        for metric in self.metrics.values():
+            pipeline.hgetall(self._key(metric.name))
+        samples_by_metric = pipeline.execute()
+
+        lines = []
+        for metric, samples in zip(self.metrics.values(), samples_by_metric):
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type_name}")
+
+            decoded = {sample.decode("utf-8"): float(value) for sample, value in samples.items()}
+            for sample in sorted(decoded, key=_sample_sort_key):
+                lines.append(f"{sample} {_format_float(decoded[sample])}")
+
+        return "\n".join(lines) + "\n"
+
+
+def _sample_sort_key(sample: str):
+    """Keep histogram buckets of the same label set together and ordered by bound."""
+    match = LE_RE.search(sample)
+    if match is None:
+        return sample, 0.0
+    bound = math.inf if match.group(1) == "+Inf" else float(match.group(1))
+    return LE_RE.sub("", sample), bound
+
+
+registry = MetricsRegistry()
+
+REQUEST_LATENCY = registry.histogram(
+    "http_request_duration_seconds", "HTTP request latency.", ["endpoint", "method", "status"],
+)
+REQUEST_DB_QUERIES = registry.histogram(
+    "http_request_db_queries", "DB queries executed per HTTP request.", ["endpoint"],
+    buckets=(0, 1, 2, 5, 10, 20, 50, 100, 200, 500),
+)
+REQUEST_DB_DURATION = registry.histogram(
+    "http_request_db_duration_seconds", "Time spent in DB queries per HTTP request.", ["endpoint"],
+)
+TASK_DURATION = registry.histogram(
+    "celery_task_duration_seconds", "Celery task duration.", ["task"],
+    buckets=(0.01, 0.1, 0.5, 1, 5, 10, 30, 60, 300, 900, 3600),
+)
+TASK_OUTCOMES = registry.counter(
+    "celery_tasks_total", "Finished celery tasks by outcome.", ["task", "outcome"],
+)
+CHECKER_PROBES = registry.counter(
+    "checker_probes_total", "Resource availability probes by result.", ["result"],
+)
+CHECKER_TIMEOUTS = registry.counter(
+    "checker_timeouts_total", "Resource probes that timed out.",
+)
+CHECKER_FAST_FAILS = registry.counter(
+    "checker_fast_fails_total", "Resource probes failed without a request because the host is known to be dead.",
+)
+CHECKER_SKIPPED = registry.counter(
+    "checker_skipped_total", "Resources left unchecked because the checker run deadline was exceeded.",
+)
+CHECKER_PREFLIGHTS = registry.counter(
+    "checker_preflights_total", "Host DNS and TCP connect preflights by result.", ["result"],
+)
+CHECKER_BYTES = registry.counter(
+    "checker_received_bytes_total", "Approximate bytes of responses received by the checker.",
+)
+CHECKER_STATUS_CHANGES = registry.counter(
+    "checker_status_changes_total", "Resource availability changes detected by the checker.",
+)
+CHECKER_PROBE_RATE = registry.gauge(
+    "checker_probes_per_second", "Probe throughput of the last checker run.",
+)
+CHECKER_DUE_RESOURCES = registry.gauge(
+    "checker_due_resources", "Resources past their next check time after the last scheduler tick.",
+)
+INGESTION_LINES = registry.counter(
+    "ingestion_lines_total", "Lines processed from uploaded archives by result.", ["result"],
+)
+INGESTION_LINE_RATE = registry.gauge(
+    "ingestion_lines_per_second", "Line throughput of the last archive processing.",
+)
+
+
+class QueryStats:
+    """Count and time of DB queries executed within a request."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # kept on the execution context, so a failed query (no after event) leaves nothing behind
+    if context is not None:
+        context._metrics_query_start = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, "_metrics_query_start", None)
+    if started is None:
+        return
+    if has_app_context():
+        stats = g.get("db_query_stats")
+        if stats is not None:
+            stats.count += 1
+            stats.duration += time.perf_counter() - started
+
+
+def _start_request_timer():
+    g.request_started = time.perf_counter()
+    g.db_query_stats = QueryStats()
+
+
+def _observe_request(response):
+    started = g.get("request_started")
+    if started is None:
+        return response
+
+    endpoint = request.endpoint or "unmatched"
+    REQUEST_LATENCY.observe(
+        time.perf_counter() - started,
+        endpoint=endpoint,
+        method=request.method,
+        status=response.status_code,
+    )
+
+    stats = g.db_query_stats
+    REQUEST_DB_QUERIES.observe(stats.count, endpoint=endpoint)
+    REQUEST_DB_DURATION.observe(stats.duration, endpoint=endpoint)
+
+    registry.flush_if_due()
+    return response
+
+
+_task_started: Dict[str, float] = {}
+
+
+def _start_task_timer(task_id, task, **kwargs):
+    _task_started[task_id] = time.perf_counter()
+
+
+def _observe_task(task_id, task, state=None, **kwargs):
+    started = _task_started.pop(task_id, None)
+    if started is not None:
+        TASK_DURATION.observe(time.perf_counter() - started, task=task.name)
+    TASK_OUTCOMES.inc(task=task.name, outcome=(state or "UNKNOWN").lower())
+    registry.flush_if_due()
+
+
+def _flush_on_shutdown(**kwargs):
+    registry.flush()
+
+
+def init_metrics(app: Flask) -> None:
+    """Connect metrics to Redis and hook request, DB and celery task events."""
+    conf = app.config["METRICS"]
+    registry.redis_client = app.extensions["redis"]
+    registry.key_prefix = conf["KEY_PREFIX"]
+    registry.flush_interval = conf["FLUSH_INTERVAL"]
+
+    app.before_request(_start_request_timer)
+    app.after_request(_observe_request)
+
+    if not event.contains(Engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+
+    task_prerun.connect(_start_task_timer, weak=False, dispatch_uid="metrics_task_prerun")
+    task_postrun.connect(_observe_task, weak=False, dispatch_uid="metrics_task_postrun")
+
+    # prefork pool processes exit without running atexit handlers
+    worker_process_shutdown.connect(_flush_on_shutdown, weak=False, dispatch_uid="metrics_worker_process_shutdown")
+    atexit.unregister(registry.flush)
+    atexit.register(registry.flush)
+
+    app.extensions["metrics"] = registry
@@ -0,0 +1,162 @@
+"""
+Opt-in per-request and per-task SQL profiler.
+
+Profiling is enabled for every request and celery task by `PROFILING.ENABLED` or for a single
+request by the `PROFILING.HEADER` request header, which is honored only in debug mode or when its
+value is the `PROFILING_SECRET` environment variable. Profiled requests get a `Server-Timing` header
+with DB time and statement count; statement shapes executed more than `N_PLUS_ONE_THRESHOLD`
+times within one request or task are reported to the log as possible N+1 queries.
+"""
+import hmac
+import logging
+import re
+import time
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+
+from celery.signals import task_postrun, task_prerun
+from flask import Flask, current_app, g, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+PARAMETER_RE = re.compile(r"%\(\w+\)s|\$\d+|\?|'(?:[^']|'')*'|\b\d+\b")
+PARAMETER_LIST_RE = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+WHITESPACE_RE = re.compile(r"\s+")
+
+_current_profile: ContextVar[Optional["SQLProfile"]] = ContextVar("sql_profile", default=None)
+
+
+def statement_shape(statement: str) -> str:
+    """Normalize statement so that executions differing only in parameters have the same shape."""
+    shape = PARAMETER_RE.sub("?", statement)
+    shape = PARAMETER_LIST_RE.sub("(?)", shape)
+    return WHITESPACE_RE.sub(" ", shape).strip()
+
+
+class SQLProfile:
+    """Statements executed within a single request or celery task."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.count = 0
+        self.duration = 0.0
+        # shape -> [executions, total duration]
+        self.shapes: Dict[str, List] = {}
+
+    def record(self, statement: str, duration: float) -> None:
+        self.count += 1
+        self.duration += duration
+
+        shape_stats = self.shapes.setdefault(statement_shape(statement), [0, 0.0])
+        shape_stats[0] += 1
+        shape_stats[1] += duration
+
+    def repeated(self, threshold: int) -> List[Tuple[str, int, float]]:
+        """Statement shapes executed more than `threshold` times, most frequent first."""
+        repeated = [
+            (shape, count, duration)
+            for shape, (count, duration) in self.shapes.items()
+            if count > threshold
+        ]
+        return sorted(repeated, key=lambda item: item[1], reverse=True)
+
+    def server_timing(self, threshold: int) -> str:
+        timing = f'db;dur={self.duration * 1000:.2f};desc="{self.count} queries"'
+        repeated = self.repeated(threshold)
+        if repeated:
+            timing += f', nplus1;desc="{len(repeated)} repeated statements"'
+        return timing
+
+    def report(self, logger: logging.Logger, threshold: int) -> None:
+        logger.info(
+            f"SQL profile of {self.name}: {self.count} queries, "
+            f"{self.duration * 1000:.2f} ms, {len(self.shapes)} distinct statements"
+        )
+        for shape, count, duration in self.repeated(threshold):
+            logger.warning(
+                f"Possible N+1 in {self.name}: statement executed {count} times "
+                f"({duration * 1000:.2f} ms): {shape[:300]}"
+            )
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # kept on the execution context, so a failed query (no after event) leaves nothing behind
+    if context is not None and _current_profile.get() is not None:
+        context._profiler_query_start = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    profile = _current_profile.get()
+    if profile is None:
+        return
+
+    started = getattr(context, "_profiler_query_start", None)
+    if started is not None:
+        profile.record(statement, time.perf_counter() - started)
+
+
+def _profiling_requested() -> bool:
+    """Whether the request enables profiling by the header, which any client can send, so it needs the secret."""
+    value = request.headers.get(current_app.config["PROFILING"]["HEADER"])
+    if not value:
+        return False
+    if current_app.debug:
+        return True
+
+    secret = current_app.config.get("PROFILING_SECRET")
+    return bool(secret) and hmac.compare_digest(value.encode(), secret.encode())
+
+
+def _start_request_profile():
+    conf = current_app.config["PROFILING"]
+    if conf["ENABLED"] or _profiling_requested():
+        g.sql_profile_token = _current_profile.set(SQLProfile(name=f"{request.method} {request.path}"))
+
+
+def _finish_request_profile(response):
+    profile = _current_profile.get()
+    if profile is None:
+        return response
+
+    threshold = current_app.config["PROFILING"]["N_PLUS_ONE_THRESHOLD"]
+    response.headers["Server-Timing"] = profile.server_timing(threshold)
+    profile.report(current_app.logger, threshold)
+    return response
+
+
+def _reset_request_profile(exc=None):
+    token = g.pop("sql_profile_token", None)
+    if token is not None:
+        _current_profile.reset(token)
+
+
+def init_profiler(app: Flask) -> None:
+    """Hook SQLAlchemy cursor events, request and celery task lifecycle."""
+    conf = app.config["PROFILING"]
+
+    app.before_request(_start_request_profile)
+    app.after_request(_finish_request_profile)
+    app.teardown_request(_reset_request_profile)
+
+    if not event.contains(Engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+
+    if not conf["ENABLED"]:
+        return
+
+    tokens = {}
+
+    def start_task_profile(task_id, task, **kwargs):
+        tokens[task_id] = _current_profile.set(SQLProfile(name=f"task {task.name}[{task_id}]"))
+
+    def finish_task_profile(task_id, task, **kwargs):
+        token = tokens.pop(task_id, None)
+        if token is None:
+            return
+        profile = _current_profile.get()
+        _current_profile.reset(token)
+        profile.report(app.logger, conf["N_PLUS_ONE_THRESHOLD"])
+
+    task_prerun.connect(start_task_profile, weak=False, dispatch_uid="profiler_task_prerun")
+    task_postrun.connect(finish_task_profile, weak=False, dispatch_uid="profiler_task_postrun")
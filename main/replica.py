@@ -0,0 +1,84 @@
+"""
+Routing of read-only queries to a Postgres replica.
+
+The replica is configured by `POSTGRES_REPLICA_HOST` (user, password and DB are the primary ones unless
+`POSTGRES_REPLICA_USER`, `POSTGRES_REPLICA_PASSWORD` and `POSTGRES_REPLICA_DB` are given) and is
+registered as the `replica` bind. `read_session()` is the replica session within requests and the
+primary session otherwise: in celery tasks, without a replica, and for read-your-writes - for the rest
+of a request that committed to the primary and for `DATABASE_REPLICA.READ_YOUR_WRITES` seconds after it,
+tracked by a cookie, so that e.g. the page of a just created resource is read from the primary.
+Clients without cookies may read lagging lists; a resource page missing on the replica is read from the
+primary by `get_resource_page`.
+"""
+import os
+from typing import Optional
+
+from flask import Flask, current_app, g, has_request_context, request
+from flask.globals import app_ctx
+from flask_sqlalchemy.query import Query
+from sqlalchemy import event
+from sqlalchemy.orm import Session, scoped_session, sessionmaker
+
+REPLICA_BIND = "replica"
+
+
+def replica_database_uri() -> Optional[str]:
+    """URI of the replica from environment variables, None if the replica is not configured."""
+    host = os.getenv("POSTGRES_REPLICA_HOST")
+    if not host:
+        return None
+
+    return "postgresql://{}:{}@{}/{}".format(
+        os.getenv("POSTGRES_REPLICA_USER", os.getenv("POSTGRES_USER", "flask")),
+        os.getenv("POSTGRES_REPLICA_PASSWORD", os.getenv("POSTGRES_PASSWORD", "")),
+        host,
+        os.getenv("POSTGRES_REPLICA_DB", os.getenv("POSTGRES_DB", "flask")),
+    )
+
+
+def _app_ctx_id() -> int:
+    return id(app_ctx._get_current_object())
+
+
+def _reads_from_primary() -> bool:
+    if not has_request_context():
+        return True
+    return g.get("db_written", False) or bool(request.cookies.get(current_app.config["DATABASE_REPLICA"]["COOKIE"]))
+
+
+def read_session() -> Session:
+    """Session for read-only queries: the replica one if it is configured and safe to read from."""
+    replica_session = current_app.extensions.get("read_session")
+    if replica_session is None or _reads_from_primary():
+        return current_app.extensions["sqlalchemy"].session
+    return replica_session()
+
+
+def _mark_written(session: Session) -> None:
+    if has_request_context():
+        g.db_written = True
+
+
+def _set_read_your_writes_cookie(response):
+    if g.get("db_written"):
+        conf = current_app.config["DATABASE_REPLICA"]
+        response.set_cookie(conf["COOKIE"], "1", max_age=conf["READ_YOUR_WRITES"], httponly=True, samesite="Lax")
+    return response
+
+
+def init_replica(app: Flask) -> None:
+    """Create the replica session if the `replica` bind is configured and track commits to the primary."""
+    if REPLICA_BIND not in app.config.get("SQLALCHEMY_BINDS", {}):
+        return
+
+    sqlalchemy = app.extensions["sqlalchemy"]
+    with app.app_context():
+        engine = sqlalchemy.engines[REPLICA_BIND]
+
+    replica_session = scoped_session(sessionmaker(bind=engine, query_cls=Query), scopefunc=_app_ctx_id)
+    app.extensions["read_session"] = replica_session
+    app.teardown_appcontext(lambda exc: replica_session.remove())
+
+    if not event.contains(sqlalchemy.session, "after_commit", _mark_written):
+        event.listen(sqlalchemy.session, "after_commit", _mark_written)
+    app.after_request(_set_read_your_writes_cookie)
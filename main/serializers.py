@@ -0,0 +1,137 @@
+"""
+Fast JSON serialization of API responses.
+
+Response payloads are built straight from DB rows: the rows are trusted, so pydantic schemas are used
+only for the list of fields and are not validated again. Payloads are encoded with orjson when it is
+installed and with the stdlib `json` otherwise. The output is byte-for-byte the same as `jsonify`
+with default settings: sorted keys, compact separators, ASCII only (payloads with non-ASCII text
+are encoded with the stdlib), HTTP dates, UUIDs as strings and a trailing newline.
+
+Float values are formatted differently by orjson, so payloads with floats should use `jsonify`.
+"""
+import dataclasses
+import decimal
+import json
+import uuid
+from datetime import date
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from flask import Response, current_app, jsonify, url_for
+from sqlalchemy import Row
+from werkzeug.http import http_date
+
+from main.db import schemas
+from main.utils import images
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+# fields of list items as validated by `PaginatedResourceListSchema`, which drops the rest of
+# `ResourceGetSchema` (the screenshot has never been a part of list items)
+LIST_ITEM_FIELDS = tuple(schemas.PaginatedResourceListSchema.__fields__["items"].type_.__fields__)
+PAGE_FIELDS = tuple(schemas.ResourceGetSchema.__fields__)
+
+
+def _default(o: Any) -> Any:
+    """Same conversions as the default Flask JSON provider."""
+    if isinstance(o, date):
+        return http_date(o)
+    if isinstance(o, (decimal.Decimal, uuid.UUID)):
+        return str(o)
+    if dataclasses.is_dataclass(o) and not isinstance(o, type):
+        return dataclasses.asdict(o)
+    if hasattr(o, "__html__"):
+        return str(o.__html__())
+    raise TypeError(f"Object of type {type(o).__name__} is not JSON serializable")
+
+
+def _dumps_stdlib(obj: Any) -> bytes:
+    return json.dumps(obj, default=_default, ensure_ascii=True, sort_keys=True, separators=(",", ":")).encode()
+
+
+def dumps(obj: Any, backend: Optional[str] = None) -> bytes:
+    """
+    Encode `obj` as compact JSON with sorted keys (without the trailing newline).
+    `backend` forces `orjson` or `json`, by default orjson is used if it is installed.
+    """
+    if backend == "json" or orjson is None:
+        return _dumps_stdlib(obj)
+
+    try:
+        data = orjson.dumps(
+            obj,
+            default=_default,
+            option=orjson.OPT_SORT_KEYS | orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS,
+        )
+    except (orjson.JSONEncodeError, TypeError):
+        # e.g. non-string dict keys, which the stdlib converts to strings
+        return _dumps_stdlib(obj)
+
+    # the stdlib escapes non-ASCII characters
+    return data if data.isascii() else _dumps_stdlib(obj)
+
+
+def json_response(obj: Any, status: int = 200) -> Response:
+    """Make a response like `jsonify(obj)` using the fast encoder."""
+    provider = current_app.json
+    compact = getattr(provider, "compact", None)
+    if compact is False or (compact is None and current_app.debug) or not getattr(provider, "sort_keys", True):
+        # pretty printed or customized output is left to Flask
+        response = jsonify(obj)
+        response.status_code = status
+        return response
+
+    return current_app.response_class(dumps(obj) + b"\n", status=status, mimetype=provider.mimetype)
+
+
+def parse_fields(value: Optional[str]) -> Optional[Tuple[str, ...]]:
+    """Parse comma separated sparse fieldset of resource list items, None means all fields."""
+    if not value:
+        return None
+
+    fields = tuple(dict.fromkeys(name.strip() for name in value.split(",") if name.strip()))
+    unknown = [name for name in fields if name not in LIST_ITEM_FIELDS]
+    if unknown or not fields:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}. Available fields: {', '.join(LIST_ITEM_FIELDS)}")
+    return fields
+
+
+def resource_list_item(row: Row, fields: Sequence[str] = LIST_ITEM_FIELDS) -> dict:
+    """List item of `ListResourceGetSchemaItem` (only `fields` of it) from a row of `get_web_resources_query`."""
+    mapping = row._mapping
+    return {name: mapping.get(name) for name in fields}
+
+
+def resource_list(rows: Iterable[Row], meta: dict, links: dict, fields: Optional[Sequence[str]] = None) -> dict:
+    """Payload of `PaginatedResourceListSchema`, items have only `fields` if given."""
+    fields = fields or LIST_ITEM_FIELDS
+    return {
+        "items": [resource_list_item(row, fields) for row in rows],
+        "meta": meta,
+        "links": links,
+    }
+
+
+def screenshot_urls(resource) -> Optional[Dict[str, str]]:
+    """URLs of the original screenshot of a `WebResource` and of its variants, None if it has no screenshot."""
+    if resource.screenshot_updated_at is None:
+        return None
+
+    # a new upload changes the URLs, so browsers don't keep showing a cached old screenshot
+    version = int(resource.screenshot_updated_at.timestamp() * 1_000_000)
+    urls = {
+        name: url_for("main.get_resource_screenshot", resource_uuid=resource.uuid, variant=name, v=version)
+        for name in current_app.config["SCREENSHOTS"]["VARIANTS"]
+    }
+    urls[images.ORIGINAL] = url_for("main.get_resource_screenshot", resource_uuid=resource.uuid, v=version)
+    return urls
+
+
+def resource_page(resource, events: List[dict]) -> dict:
+    """Payload of `ResourcePageSchema` for a `WebResource` and its events (event_type, timestamp)."""
+    data = {name: getattr(resource, name, None) for name in PAGE_FIELDS}
+    data["screenshot_urls"] = screenshot_urls(resource)
+    data["events"] = events
+    return data
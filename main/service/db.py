@@ -1,15 +1,22 @@
-from typing import List, NoReturn, Optional, TypedDict
+import uuid
+from datetime import timedelta
+from typing import (Dict, Iterator, List, NoReturn, Optional, Sequence, Tuple,
+                    TypedDict)
 
 from flask import url_for
-from sqlalchemy import desc
-from sqlalchemy.orm import joinedload
+from sqlalchemy import Row, delete, desc, func, literal, select, true, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import defer, joinedload
 from sqlalchemy.orm.query import Query
-from werkzeug.datastructures import FileStorage
 
 from main.app import db
-from main.db.models import (FileProcessingRequest, NewsFeedItem, StatusOption,
-                            WebResource, WebResourceStatus)
+from main.db.models import (CheckRun, EventType, FileProcessingError,
+                            FileProcessingRequest, NewsFeedItem,
+                            ResourceLatencyBucket, ScreenshotVariant,
+                            StatusOption, WebResource, WebResourceStatus)
+from main.replica import read_session
 from main.service import exceptions
+from main.utils import images, latency
 from main.utils.urlparser import parse_url
 
 
@@ -52,6 +59,22 @@ def create_web_resource(validated_url: str) -> WebResource:
         return web_resource
 
 
+# columns of resource list items, see `ListResourceGetSchemaItem`
+RESOURCE_LIST_COLUMNS = {
+    "id": WebResource.id,
+    "uuid": WebResource.uuid,
+    "full_url": WebResource.full_url,
+    "protocol": WebResource.protocol,
+    "domain": WebResource.domain,
+    "domain_zone": WebResource.domain_zone,
+    "url_path": WebResource.url_path,
+    "query_params": WebResource.query_params,
+    "status_code": WebResourceStatus.status_code,
+    "is_available": WebResourceStatus.is_available,
+}
+STATUS_FIELDS = {"status_code", "is_available"}
+
+
 def get_web_resources_query(
     left_join: bool = False,
     domain_zone: Optional[str] = None,
@@ -59,37 +82,39 @@ def get_web_resources_query(
     resource_uuid: Optional[str] = None,
     is_available: Optional[str] = None,
     unavailable_count: Optional[int] = None,
+    fields: Optional[Sequence[str]] = None,
 ) -> Query:
     """
     Get all WebResource instances from database with the given criteria.
-    If left join is True then return query with relative data (status codes).
-    Else return query with all Web resources."""
+    If left join is True then return query of list item `fields` (all by default) with the last
+    status, statuses are joined only if status fields are requested or filtered by.
+    Else return query with all Web resources without heavy columns (loaded on access)."""
 
     if not left_join:
-        query = db.session.query(WebResource)
+        query = read_session().query(WebResource).options(
+            defer(WebResource.screenshot),
+            defer(WebResource.query_params),
+        )
 
     else:
-        # base query
-        query = db.session.query(
-            WebResource.id,
-            WebResource.uuid,
-            WebResource.full_url,
-            WebResourceStatus.status_code,
-            WebResourceStatus.is_available,
-            WebResource.domain_zone,
-            WebResource.domain,
-            WebResource.screenshot,
-            WebResource.protocol,
-        ).join(
-            WebResourceStatus,
-            WebResource.id == WebResourceStatus.resource_id,
-            isouter=True
-        ).order_by(
-            WebResource.id.desc(),
-            desc(WebResourceStatus.request_time)  # Сортируем по убыванию времени статуса
-        ).distinct(
-            WebResource.id
-        )
+        fields = fields or RESOURCE_LIST_COLUMNS.keys()
+        query = read_session().query(
+            *(RESOURCE_LIST_COLUMNS[name].label(name) for name in fields)
+        ).select_from(WebResource)
+
+        if is_available or STATUS_FIELDS.intersection(fields):
+            query = query.join(
+                WebResourceStatus,
+                WebResource.id == WebResourceStatus.resource_id,
+                isouter=True
+            ).order_by(
+                WebResource.id.desc(),
+                desc(WebResourceStatus.request_time)  # Сортируем по убыванию времени статуса
+            ).distinct(
+                WebResource.id
+            )
+        else:
+            query = query.order_by(WebResource.id.desc())
 
         # applying filters to query
     if domain_zone:
@@ -136,30 +161,264 @@ def delete_web_resource(resource: WebResource):
     )
 
 
-def save_status_code_for_web_resource_response(
-    resource: WebResource,
+def claim_due_resources(limit: int, lease_seconds: int) -> List[Row]:
+    """
+    Claim up to `limit` resources due for a check, the most overdue first, and return their IDs and domains.
+    Rows locked by a concurrent claim are skipped, claimed rows are postponed by `lease_seconds`
+    so that they are claimed again only if the check did not reschedule them.
+    """
+    due_ids = select(WebResource.id).where(
+        WebResource.next_check_at <= func.now()
+    ).order_by(
+        WebResource.next_check_at
+    ).limit(limit).with_for_update(skip_locked=True)
+
+    resources = db.session.execute(
+        update(WebResource)
+        .where(WebResource.id.in_(due_ids))
+        .values(next_check_at=func.now() + timedelta(seconds=lease_seconds))
+        .returning(WebResource.id, WebResource.domain)
+    ).all()
+    db.session.commit()
+
+    return resources
+
+
+def count_due_resources() -> int:
+    """Count resources whose next check time has passed."""
+    return db.session.scalar(
+        select(func.count(WebResource.id)).where(WebResource.next_check_at <= func.now())
+    )
+
+
+def iter_resources_to_check(
+    resource_ids: Optional[List[int]] = None,
+    after_id: Optional[int] = None,
+    order_by_domain: bool = False,
+    batch_size: int = 1000,
+) -> Iterator[Row]:
+    """
+    Stream slim rows of resources to check (id, full_url, unavailable_count, check_interval and
+    last_availability from the latest status) in the order of IDs, optionally grouped by domain,
+    through a server-side cursor.
+    The cursor uses its own connection, so commits of check results do not close it.
+    """
+    last_status = select(
+        WebResourceStatus.is_available
+    ).where(
+        WebResourceStatus.resource_id == WebResource.id
+    ).order_by(
+        desc(WebResourceStatus.request_time)
+    ).limit(1).lateral()
+
+    query = select(
+        WebResource.id,
+        WebResource.full_url,
+        WebResource.unavailable_count,
+        WebResource.check_interval,
+        last_status.c.is_available.label("last_availability"),
+    ).outerjoin(
+        last_status, true()
+    ).order_by(
+        *([WebResource.domain] if order_by_domain else []), WebResource.id
+    )
+
+    if resource_ids is not None:
+        query = query.where(WebResource.id.in_(resource_ids))
+    if after_id is not None:
+        query = query.where(WebResource.id > after_id)
+
+    with db.engine.connect() as connection:
+        yield from connection.execution_options(stream_results=True, yield_per=batch_size).execute(query)
+
+
+def save_check_result(
+    resource_id: int,
     status_code: int,
     is_available: bool,
+    status_changed: bool,
+    check_interval: int,
+    delay: float,
+    ttfb_ms: Optional[int] = None,
+    total_ms: Optional[int] = None,
 ):
-    """Save new record for WebResourceStatus in DB."""
-    status = WebResourceStatus(
-        status_code=status_code,
-        resource=resource,
-        is_available=is_available,
+    """
+    Save status and latency of the checked resource, update its unavailable counter, add news feed
+    item if status has changed and schedule the next check in `delay` seconds, all in one transaction.
+    """
+    updated = db.session.execute(
+        update(WebResource).where(
+            WebResource.id == resource_id
+        ).values(
+            unavailable_count=0 if is_available else func.coalesce(WebResource.unavailable_count, 0) + 1,
+            check_interval=check_interval,
+            next_check_at=func.now() + timedelta(seconds=delay),
+        )
     )
-    db.session.add(status)
+
+    # resource could be deleted while it was checked
+    if updated.rowcount:
+        db.session.add(WebResourceStatus(
+            resource_id=resource_id,
+            status_code=status_code,
+            is_available=is_available,
+            ttfb_ms=ttfb_ms,
+            total_ms=total_ms,
+        ))
+        if total_ms is not None:
+            _add_to_latency_histograms(resource_id=resource_id, latencies={"ttfb": ttfb_ms, "total": total_ms})
+        if status_changed:
+            db.session.add(NewsFeedItem(event_type=EventType.STATUS_CHANGED, resource_id=resource_id))
+
     db.session.commit()
 
 
-def update_counter_for_resource_availability(resource: WebResource, is_available: bool):
-    """Increment or reset counter in WebResource model."""
-    if is_available:
-        resource.unavailable_count = 0
+def claim_check_run(stale_after: int) -> Optional[CheckRun]:
+    """
+    Take the latest unfinished check run to resume it: paused one or in process without checkpoints
+    for `stale_after` seconds (its worker has died). Start a new run if there is no unfinished one.
+    Return None if the latest run is still in process.
+    """
+    # row lock below locks nothing when there is no unfinished run, so concurrent claims
+    # (e.g. by every checker worker on start) would each create a run
+    db.session.execute(select(func.pg_advisory_xact_lock(func.hashtext("check_run_claim"))))
+
+    is_stale = CheckRun.updated_at < func.now() - timedelta(seconds=stale_after)
+    found = db.session.execute(
+        select(CheckRun, is_stale.label("is_stale")).where(
+            CheckRun.status.in_([StatusOption.INPROCESS, StatusOption.PENDING])
+        ).order_by(
+            CheckRun.id.desc()
+        ).limit(1).with_for_update(of=CheckRun)
+    ).first()
+
+    if found is None:
+        run = CheckRun(
+            status=StatusOption.INPROCESS,
+            total_count=db.session.scalar(select(func.count(WebResource.id))),
+        )
+
+    elif found.CheckRun.status == StatusOption.INPROCESS and not found.is_stale:
+        db.session.rollback()
+        return None
+
     else:
-        resource.unavailable_count += 1
-    db.session.add(resource)
+        run = found.CheckRun
+        run.status = StatusOption.INPROCESS
+        run.resumed_count += 1
+        run.updated_at = func.now()
+
+    db.session.add(run)
     db.session.commit()
 
+    return run
+
+
+def has_unfinished_check_run() -> bool:
+    return db.session.scalar(
+        select(CheckRun.id).where(
+            CheckRun.status.in_([StatusOption.INPROCESS, StatusOption.PENDING])
+        ).limit(1)
+    ) is not None
+
+
+def checkpoint_check_run(
+    run: CheckRun,
+    last_resource_id: Optional[int],
+    checked_count: int,
+    timeouts_count: int,
+    fast_failed_count: int,
+    bytes_received: int,
+    elapsed_seconds: float,
+    status: Optional[StatusOption] = None,
+):
+    """Add progress since the previous checkpoint to the run and optionally change its status."""
+    if last_resource_id is not None:
+        run.last_resource_id = last_resource_id
+
+    run.checked_count = CheckRun.checked_count + checked_count
+    run.timeouts_count = CheckRun.timeouts_count + timeouts_count
+    run.fast_failed_count = CheckRun.fast_failed_count + fast_failed_count
+    run.bytes_received = CheckRun.bytes_received + bytes_received
+    run.elapsed_seconds = CheckRun.elapsed_seconds + elapsed_seconds
+    run.updated_at = func.now()
+
+    if status is not None:
+        run.status = status
+        if status in (StatusOption.SUCCEEDED, StatusOption.FAILED):
+            run.finished_at = func.now()
+
+    db.session.add(run)
+    db.session.commit()
+
+
+def _add_to_latency_histograms(resource_id: int, latencies: Dict[str, int]):
+    """Increment today's histogram buckets of the resource for each latency metric."""
+    statement = pg_insert(ResourceLatencyBucket).values([
+        dict(
+            resource_id=resource_id,
+            day=func.current_date(),
+            metric=metric,
+            bucket=latency.bucket_for(value),
+            probes=1,
+        )
+        for metric, value in latencies.items()
+    ])
+    db.session.execute(statement.on_conflict_do_update(
+        index_elements=[
+            ResourceLatencyBucket.resource_id,
+            ResourceLatencyBucket.day,
+            ResourceLatencyBucket.metric,
+            ResourceLatencyBucket.bucket,
+        ],
+        set_={"probes": ResourceLatencyBucket.probes + statement.excluded.probes},
+    ))
+
+
+def get_latency_histograms(resource_id: int, days: int) -> Dict[str, Dict[int, int]]:
+    """Sum daily latency histograms of the resource for the last `days` days (today included) by metric."""
+    rows = db.session.execute(
+        select(
+            ResourceLatencyBucket.metric,
+            ResourceLatencyBucket.bucket,
+            func.sum(ResourceLatencyBucket.probes),
+        ).where(
+            ResourceLatencyBucket.resource_id == resource_id,
+            ResourceLatencyBucket.day > func.current_date() - days,
+        ).group_by(
+            ResourceLatencyBucket.metric,
+            ResourceLatencyBucket.bucket,
+        )
+    ).all()
+
+    histograms: Dict[str, Dict[int, int]] = {}
+    for metric, bucket, probes in rows:
+        histograms.setdefault(metric, {})[bucket] = int(probes)
+    return histograms
+
+
+def rollback():
+    """Roll back the current transaction, e.g. to save progress after a failed statement."""
+    db.session.rollback()
+
+
+def get_check_runs_query() -> Query:
+    """Get query of check runs, the latest first."""
+    return db.session.query(
+        *CheckRun.__table__.columns
+    ).order_by(
+        CheckRun.id.desc()
+    )
+
+
+def get_check_run_by_id(run_id: int) -> CheckRun | NoReturn:
+    run = db.session.get(CheckRun, run_id)
+
+    if not run:
+        raise exceptions.NotFoundError
+
+    return run
+
 
 def get_resource_by_uuid(uuid_: str) -> WebResource | NoReturn:
     resource = WebResource.query.filter_by(uuid=uuid_).first()
@@ -170,10 +429,13 @@ def get_resource_by_uuid(uuid_: str) -> WebResource | NoReturn:
     return resource
 
 
-def add_image_to_resource(web_resource: WebResource, image: FileStorage):
-    """Add screenshot to resource in DB."""
-    web_resource.screenshot = image.read()
+def add_image_to_resource(web_resource: WebResource, image: bytes, mimetype: str) -> None:
+    """Add screenshot to resource in DB, variants of the previous one are deleted."""
+    web_resource.screenshot = image
+    web_resource.screenshot_mimetype = mimetype
+    web_resource.screenshot_updated_at = func.now()
     db.session.add(web_resource)
+    db.session.execute(delete(ScreenshotVariant).where(ScreenshotVariant.resource_id == web_resource.id))
     db.session.commit()
 
     # create_newsfeed_item(
@@ -182,6 +444,109 @@ def add_image_to_resource(web_resource: WebResource, image: FileStorage):
     # )
 
 
+def get_screenshot(resource_id: int) -> Optional[Row]:
+    """Original screenshot of resource (screenshot, screenshot_updated_at), None if there is none."""
+    return db.session.execute(
+        select(WebResource.screenshot, WebResource.screenshot_updated_at)
+        .where(WebResource.id == resource_id, WebResource.screenshot.isnot(None))
+    ).first()
+
+
+def save_screenshot_variants(resource_id: int, source_updated_at, variants: Dict[str, images.ImageVariant]) -> bool:
+    """
+    Save variants made from the screenshot uploaded at `source_updated_at`.
+    Return False without saving if the screenshot was replaced meanwhile.
+    """
+    current_updated_at = db.session.execute(
+        select(WebResource.screenshot_updated_at)
+        .where(WebResource.id == resource_id)
+        .with_for_update()
+    ).scalar()
+
+    if current_updated_at is None or current_updated_at != source_updated_at or not variants:
+        db.session.rollback()
+        return False
+
+    stmt = pg_insert(ScreenshotVariant).values([
+        {
+            "resource_id": resource_id,
+            "name": name,
+            "mimetype": variant.mimetype,
+            "width": variant.width,
+            "height": variant.height,
+            "content": variant.content,
+            "source_updated_at": source_updated_at,
+        }
+        for name, variant in variants.items()
+    ])
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[ScreenshotVariant.resource_id, ScreenshotVariant.name],
+        set_={
+            name: stmt.excluded[name]
+            for name in ("mimetype", "width", "height", "content", "source_updated_at")
+        },
+    )
+    db.session.execute(stmt)
+    db.session.commit()
+    return True
+
+
+def get_resource_ids_missing_screenshot_variants(variant_names: Sequence[str]) -> List[int]:
+    """IDs of resources with a screenshot lacking any of `variant_names` made from its current version."""
+    made_count = (
+        select(func.count())
+        .where(
+            ScreenshotVariant.resource_id == WebResource.id,
+            ScreenshotVariant.name.in_(variant_names),
+            ScreenshotVariant.source_updated_at == WebResource.screenshot_updated_at,
+        )
+        .scalar_subquery()
+    )
+    return list(db.session.scalars(
+        select(WebResource.id)
+        .where(WebResource.screenshot_updated_at.isnot(None), made_count < len(variant_names))
+        .order_by(WebResource.id)
+    ))
+
+
+def get_screenshot_file(resource_uuid: str, variant: Optional[str] = None) -> Row:
+    """
+    Screenshot `variant` of resource (content, mimetype, updated_at, variant), the original one if
+    variant is not given or is not generated yet for the current original. Raise NotFoundError if
+    there is no screenshot.
+    """
+    if variant is not None:
+        row = db.session.execute(
+            select(
+                ScreenshotVariant.content,
+                ScreenshotVariant.mimetype,
+                ScreenshotVariant.source_updated_at.label("updated_at"),
+                ScreenshotVariant.name.label("variant"),
+            )
+            .join(WebResource, WebResource.id == ScreenshotVariant.resource_id)
+            .where(
+                WebResource.uuid == resource_uuid,
+                ScreenshotVariant.name == variant,
+                ScreenshotVariant.source_updated_at == WebResource.screenshot_updated_at,
+            )
+        ).first()
+        if row is not None:
+            return row
+
+    row = db.session.execute(
+        select(
+            WebResource.screenshot.label("content"),
+            WebResource.screenshot_mimetype.label("mimetype"),
+            WebResource.screenshot_updated_at.label("updated_at"),
+            literal(images.ORIGINAL).label("variant"),
+        )
+        .where(WebResource.uuid == resource_uuid, WebResource.screenshot.isnot(None))
+    ).first()
+    if row is None:
+        raise exceptions.NotFoundError
+    return row
+
+
 def create_file_processing_request() -> int:
     """Create FileProcessingRequest model instance in DB and returns its ID."""
     processing_request = FileProcessingRequest()
@@ -191,58 +556,152 @@ def create_file_processing_request() -> int:
     return processing_request.id
 
 
-def get_file_processing_request_by_id(request_id: int) -> Optional[FileProcessingRequest]:
-    """Find FileProcessingRequest by given ID and return it if found else return None."""
-    processing_request = FileProcessingRequest.query.filter_by(id=request_id).one_or_none()
-    return processing_request
+def get_processing_queue(stale_after: int) -> Dict[str, int]:
+    """
+    Depth of the file processing queue: pending and in process requests and bytes of their archives.
+    Requests created more than `stale_after` seconds ago are considered abandoned and are not counted.
+    """
+    row = db.session.execute(
+        select(
+            func.count().filter(FileProcessingRequest.status == StatusOption.PENDING).label("pending"),
+            func.count().filter(FileProcessingRequest.status == StatusOption.INPROCESS).label("in_process"),
+            func.coalesce(func.sum(FileProcessingRequest.size_bytes), 0).label("staged_bytes"),
+        )
+        .where(
+            FileProcessingRequest.status.in_([StatusOption.PENDING, StatusOption.INPROCESS]),
+            FileProcessingRequest.created_at >= func.now() - timedelta(seconds=stale_after),
+        )
+    ).one()
 
+    return {"pending": row.pending, "in_process": row.in_process, "staged_bytes": int(row.staged_bytes)}
 
-def extract_duplicates(urls: List[str]) -> List[str]:
 
-    existing_resources = db.session.query(WebResource).filter(
-        WebResource.full_url.in_(urls)
-    ).all()
+def _find_recent_processing_request(content_hash: str, size_bytes: int, window: int) -> Optional[int]:
+    return db.session.execute(
+        select(FileProcessingRequest.id)
+        .where(
+            FileProcessingRequest.content_hash == content_hash,
+            FileProcessingRequest.size_bytes == size_bytes,
+            FileProcessingRequest.status != StatusOption.FAILED,
+            FileProcessingRequest.created_at >= func.now() - timedelta(seconds=window),
+        )
+        .order_by(desc(FileProcessingRequest.created_at))
+        .limit(1)
+    ).scalar()
+
+
+def get_or_create_file_processing_request(
+    content_hash: str,
+    size_bytes: int,
+    window: int,
+    max_active_requests: int,
+    max_staged_bytes: int,
+    stale_after: int,
+) -> Tuple[int, bool]:
+    """
+    Find a not failed request for the same file created within `window` seconds or create a new one.
+    Return its ID and whether it was created.
+    A new request is admitted only if pending and in process requests and their archives stay within
+    `max_active_requests` and `max_staged_bytes`, else QueueFullError is raised.
+
+    Admission takes a single global lock, so creation of new requests is serialized across all
+    web workers (the transaction is short, the archive is read before it). Deduplicated uploads
+    are answered before the lock.
+    """
+    if window > 0:
+        existing_id = _find_recent_processing_request(content_hash, size_bytes, window)
+        if existing_id is not None:
+            db.session.commit()
+            return existing_id, False
+
+    # uploads wait for each other until the transaction ends, so admission checks do not race
+    db.session.execute(select(func.pg_advisory_xact_lock(func.hashtext("file_processing_admission"))))
+
+    if window > 0:
+        # the same file could be admitted by a concurrent upload while this one waited for the lock
+        existing_id = _find_recent_processing_request(content_hash, size_bytes, window)
+        if existing_id is not None:
+            db.session.commit()
+            return existing_id, False
+
+    queue = get_processing_queue(stale_after=stale_after)
+    if (
+        queue["pending"] + queue["in_process"] >= max_active_requests
+        or queue["staged_bytes"] + size_bytes > max_staged_bytes
+    ):
+        db.session.rollback()
+        raise exceptions.QueueFullError(queue)
+
+    processing_request = FileProcessingRequest(content_hash=content_hash, size_bytes=size_bytes)
+    db.session.add(processing_request)
+    db.session.commit()
 
-    # extract it full url field
-    existing_urls = [obj.full_url for obj in existing_resources]
+    return processing_request.id, True
 
-    # filter all urls that need to be save
-    urls_to_save = [url for url in urls if url not in existing_urls]
 
-    return urls_to_save
+def get_file_processing_request_by_id(request_id: int) -> Optional[FileProcessingRequest]:
+    """Find FileProcessingRequest by given ID and return it if found else return None."""
+    processing_request = FileProcessingRequest.query.filter_by(id=request_id).one_or_none()
+    return processing_request
 
 
 def bulk_create_web_resources(validated_urls: List[str]):
-    """Parse and save multiple WebResource instances in the database using bulk_create."""
-    web_resources = []
-
-    urls_to_save = extract_duplicates(urls=validated_urls)
+    """
+    Parse and save multiple WebResource instances in the database with a single INSERT,
+    URLs that already exist (or are inserted concurrently by other chunks) are skipped.
+    """
+    rows = []
+    for url in dict.fromkeys(validated_urls):
+        parsed_url = parse_url(url=url)
+        rows.append({
+            "uuid": uuid.uuid4(),
+            "full_url": url,
+            "protocol": parsed_url.protocol,
+            "domain": parsed_url.domain,
+            "domain_zone": parsed_url.domain_zone,
+            "url_path": parsed_url.path,
+            "query_params": parsed_url.query_params,
+        })
+
+    if not rows:
+        return
+
+    db.session.execute(
+        pg_insert(WebResource).on_conflict_do_nothing(index_elements=[WebResource.full_url]),
+        rows,
+    )
+    db.session.commit()
 
-    # find in DB those WebResources instances that already exist
 
-    for url in urls_to_save:
-        parsed_url = parse_url(url=url)
-        web_resource = WebResource(
-            full_url=url,
-            protocol=parsed_url.protocol,
-            domain=parsed_url.domain,
-            domain_zone=parsed_url.domain_zone,
-            url_path=parsed_url.path,
-            query_params=parsed_url.query_params,
-        )
-        web_resources.append(web_resource)
+def bulk_create_processing_errors(request_id: int, errors: List[dict]):
+    """Save invalid lines (line_number, line, reason) of the request, lines saved by a retried chunk are skipped."""
+    if not errors:
+        return
 
-    db.session.bulk_save_objects(web_resources)
+    db.session.execute(
+        pg_insert(FileProcessingError).on_conflict_do_nothing(
+            index_elements=[FileProcessingError.request_id, FileProcessingError.line_number],
+        ),
+        [{"request_id": request_id, **error} for error in errors],
+    )
     db.session.commit()
 
 
+def get_processing_errors(request_id: int, cursor: Optional[int], limit: int) -> List[FileProcessingError]:
+    """Invalid lines of the request ordered by line number, starting after the `cursor` line number."""
+    query = select(FileProcessingError).where(FileProcessingError.request_id == request_id)
+    if cursor is not None:
+        query = query.where(FileProcessingError.line_number > cursor)
+
+    return db.session.scalars(query.order_by(FileProcessingError.line_number).limit(limit)).all()
+
+
 def update_processing_request(
     processing_request: FileProcessingRequest,
     task_id: Optional[str] = None,
     total_count: Optional[int] = None,
     processed_count: Optional[int] = None,
     errors_count: Optional[int] = None,
-    error_urls: Optional[List[str]] = None,
     status: Optional[StatusOption] = None,
 ):
     """Update the given fields in the given processing request in DB."""
@@ -259,9 +718,6 @@ def update_processing_request(
     if errors_count is not None:
         processing_request.errors_count = errors_count
 
-    if error_urls is not None:
-        processing_request.error_urls = error_urls
-
     if status is not None:
         processing_request.status = status
 
@@ -282,31 +738,41 @@ def create_newsfeed_item(resource, event):
 
 
 def get_resource_page(resource_uuid: str):
-    """Get all WebResource data including related."""
-    try:
-        get_resource_by_uuid(resource_uuid)
-    except exceptions.NotFoundError:
-        raise
+    """
+    Get all WebResource data including related. Raise NotFoundError if there is no such resource.
+    A resource missing on the replica is looked up on the primary: it could be just created by a client
+    that does not keep the read-your-writes cookie (e.g. an API client) while the replica lags behind.
+    """
+    def query_page(session):
+        # Join the News and StatusCode tables with the WebResource table
+        return session.query(WebResource, NewsFeedItem, WebResourceStatus).\
+            options(defer(WebResource.screenshot)).\
+            join(NewsFeedItem, WebResource.id == NewsFeedItem.resource_id, isouter=True).\
+            join(WebResourceStatus, WebResourceStatus.resource_id == WebResource.id, isouter=True).\
+            filter(WebResource.uuid == resource_uuid).\
+            all()
+
+    session = read_session()
+    page = query_page(session)
+    if not page and session is not db.session:
+        page = query_page(db.session)
+    if not page:
+        raise exceptions.NotFoundError
 
-    # Join the News and StatusCode tables with the WebResource table
-    query = db.session.query(WebResource, NewsFeedItem, WebResourceStatus).\
-        join(NewsFeedItem, WebResource.id == NewsFeedItem.resource_id, isouter=True).\
-        join(WebResourceStatus, WebResourceStatus.resource_id == WebResource.id, isouter=True).\
-        filter(WebResource.uuid == resource_uuid)
-    # Execute the query and retrieve the results
-    return query.all()
+    return page
 
 
 def get_news_items():
     """Retrieve all news feed items sorted by timestamp."""
-    news_items = NewsFeedItem.query \
+    news_items = read_session().query(NewsFeedItem) \
         .options(joinedload(NewsFeedItem.resource)) \
         .order_by(NewsFeedItem.timestamp.desc()) \
         .all()
     return news_items
 
 
-def paginate_query(query, page, per_page, endpoint, **kwargs) -> PaginatedItemDict:
+def paginate_query(query, page, per_page, endpoint, as_dict: bool = True, **kwargs) -> PaginatedItemDict:
+    """Paginate query of columns. Items are dicts, or rows as they are if `as_dict` is False."""
     items_ = query.paginate(
         page=page,
         per_page=per_page,
@@ -314,7 +780,7 @@ def paginate_query(query, page, per_page, endpoint, **kwargs) -> PaginatedItemDi
     )
 
     data: PaginatedItemDict = {
-        'items': [item._asdict() for item in items_.items],
+        'items': [item._asdict() for item in items_.items] if as_dict else items_.items,
         '_meta': {
             'page': page,
             'per_page': per_page,
@@ -3,3 +3,16 @@ class AlreadyExistsError(Exception):
 
 class NotFoundError(Exception):
     pass
+
+class FileTooLargeError(Exception):
+    pass
+
+class InvalidFileError(Exception):
+    pass
+
+class QueueFullError(Exception):
+    """Raised when a new file processing request exceeds admission caps, `queue` is the current queue depth."""
+
+    def __init__(self, queue: dict):
+        super().__init__("File processing queue is full, try again later.")
+        self.queue = queue
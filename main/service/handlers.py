@@ -1,13 +1,30 @@
-import json
-from typing import Optional
+from io import BytesIO
+from typing import Optional, Sequence, Tuple
 
+from flask import Response, current_app, send_file, url_for
 from pydantic import ValidationError
+from werkzeug.datastructures import FileStorage
 from werkzeug.datastructures.structures import ImmutableMultiDict
 
+from main import serializers
 from main.db import models, schemas
 from main.service import db, exceptions
-from main.tasks import (FileProcessingTaskResponse,
+from main.tasks import (FileProcessingTaskResponse, ProcessingProgress,
+                        make_screenshot_variants,
                         process_urls_from_zip_archive)
+from main.utils import images, latency, ziploader
+
+# multipart boundaries and part headers around an uploaded file
+MULTIPART_OVERHEAD = 16 * 1024
+
+
+def check_upload_size(content_length: Optional[int], max_size: int) -> None:
+    """
+    Raise FileTooLargeError if the request body can't fit a file of `max_size` bytes.
+    Called before `request.files` is accessed, since parsing spools the whole body.
+    """
+    if content_length is not None and content_length > max_size + MULTIPART_OVERHEAD:
+        raise exceptions.FileTooLargeError(f"File is larger than {max_size} bytes")
 
 
 def handle_post_url_json(body) -> schemas.ResourceCreateResponseSchema:
@@ -34,30 +51,70 @@ def handle_post_url_json(body) -> schemas.ResourceCreateResponseSchema:
         raise e
 
 
-def handle_post_url_file(files) -> int:
+def handle_post_url_file(files) -> Tuple[int, bool]:
     try:
         validated_data = schemas.ZipFileRequestSchema(**files)
 
     except ValidationError as e:
         raise e
 
-    # create ZipFileProcessingRequest model instance
-    processing_request_id = db.create_file_processing_request()
+    return handle_process_zip_file(validated_data.file)
 
-    # create celery task and pass id of created request to it as argument
-    process_urls_from_zip_archive.delay(
-        zip_file=validated_data.file.read(),
-        request_id=processing_request_id,
+
+def handle_process_zip_file(file: FileStorage) -> Tuple[int, bool]:
+    """
+    Queue processing of the archive unless the same file (by SHA-256 of its content) was uploaded within
+    `FILE_PROCESSING.DEDUPLICATION_WINDOW` seconds. Return ID of the request and whether it was created.
+    Raise FileTooLargeError if the archive exceeds staged bytes cap and QueueFullError if the queue is full.
+    """
+    conf = current_app.config["FILE_PROCESSING"]
+    try:
+        zip_file, content_hash = ziploader.read_with_digest(file.stream, max_size=conf["ADMISSION"]["MAX_STAGED_BYTES"])
+    except images.UploadTooLargeError as e:
+        raise exceptions.FileTooLargeError(str(e)) from e
+
+    # create ZipFileProcessingRequest model instance or find the one for the same file
+    processing_request_id, created = db.get_or_create_file_processing_request(
+        content_hash=content_hash,
+        size_bytes=len(zip_file),
+        window=conf["DEDUPLICATION_WINDOW"],
+        max_active_requests=conf["ADMISSION"]["MAX_ACTIVE_REQUESTS"],
+        max_staged_bytes=conf["ADMISSION"]["MAX_STAGED_BYTES"],
+        stale_after=conf["ADMISSION"]["STALE_AFTER"],
     )
 
-    return processing_request_id
+    if created:
+        # create celery task and pass id of created request to it as argument
+        process_urls_from_zip_archive.delay(
+            zip_file=zip_file,
+            request_id=processing_request_id,
+        )
+
+    return processing_request_id, created
+
+
+def handle_get_processing_queue() -> dict:
+    """Current depth of the file processing queue and its admission caps."""
+    admission = current_app.config["FILE_PROCESSING"]["ADMISSION"]
+    queue = db.get_processing_queue(stale_after=admission["STALE_AFTER"])
+    return {
+        **queue,
+        "max_active_requests": admission["MAX_ACTIVE_REQUESTS"],
+        "max_staged_bytes": admission["MAX_STAGED_BYTES"],
+        "accepting": (
+            queue["pending"] + queue["in_process"] < admission["MAX_ACTIVE_REQUESTS"]
+            and queue["staged_bytes"] < admission["MAX_STAGED_BYTES"]
+        ),
+    }
 
 
 def handle_add_image_for_web_resource(files: ImmutableMultiDict, resource_uuid: str) -> None:
+    """
+    Save uploaded screenshot (read up to `SCREENSHOTS.MAX_UPLOAD_SIZE` bytes) and queue making of its variants.
+    """
     try:
         web_resource = db.get_resource_by_uuid(resource_uuid)
         validated_data = schemas.FileRequestSchema(**files)
-        db.add_image_to_resource(web_resource, validated_data.file)
 
     except exceptions.NotFoundError:
         raise
@@ -65,6 +122,44 @@ def handle_add_image_for_web_resource(files: ImmutableMultiDict, resource_uuid:
     except ValidationError as e:
         raise e
 
+    try:
+        image = images.read_limited(validated_data.file.stream, current_app.config["SCREENSHOTS"]["MAX_UPLOAD_SIZE"])
+        mimetype = images.image_mimetype(image)
+
+    except images.UploadTooLargeError as e:
+        raise exceptions.FileTooLargeError(str(e)) from e
+
+    except ValueError as e:
+        raise exceptions.InvalidFileError(str(e)) from e
+
+    db.add_image_to_resource(web_resource, image=image, mimetype=mimetype)
+    make_screenshot_variants.delay(web_resource.id)
+
+
+def handle_get_screenshot(resource_uuid: str, variant: Optional[str]) -> Response:
+    """Screenshot file of resource, `variant` is a name from `SCREENSHOTS.VARIANTS` or `original`."""
+    conf = current_app.config["SCREENSHOTS"]
+    variant = variant or images.ORIGINAL
+    if variant != images.ORIGINAL and variant not in conf["VARIANTS"]:
+        raise ValueError(f"Unknown variant: {variant}. Available variants: {', '.join([*conf['VARIANTS'], images.ORIGINAL])}")
+
+    screenshot = db.get_screenshot_file(resource_uuid, variant=None if variant == images.ORIGINAL else variant)
+
+    # variant is served as the original until it is made, that response must not be cached
+    # under the variant URL, otherwise browsers keep the full-size image after the variant is ready
+    is_fallback = screenshot.variant != variant
+    response = send_file(
+        BytesIO(screenshot.content),
+        mimetype=screenshot.mimetype or "application/octet-stream",
+        etag=f"{screenshot.variant}-{screenshot.updated_at.timestamp() if screenshot.updated_at else 0}",
+        last_modified=screenshot.updated_at,
+        max_age=0 if is_fallback else conf["CACHE_MAX_AGE"],
+    )
+    if is_fallback:
+        response.cache_control.no_cache = True
+    response.headers["X-Screenshot-Variant"] = screenshot.variant
+    return response
+
 
 def handle_get_request_status(request_id, storage_client) -> FileProcessingTaskResponse:
     processing_request = db.get_file_processing_request_by_id(request_id)
@@ -73,28 +168,53 @@ def handle_get_request_status(request_id, storage_client) -> FileProcessingTaskR
         raise exceptions.NotFoundError
 
     if processing_request.status == models.StatusOption.INPROCESS:
-        task_id = processing_request.task_id
-        status_info_from_storage = storage_client.get(name=task_id)
-
-        if status_info_from_storage:
-            status_info = json.loads(status_info_from_storage)
-            return FileProcessingTaskResponse(**status_info)
-        else:
-            # TODO: unexpected case but should be handled
-            ...
-
-    else:
-        status_info: FileProcessingTaskResponse = {
-            "status": processing_request.status.value,
-            "processed": processing_request.processed_count,
-            "total": processing_request.total_count,
-            "errors": {
-                "count": processing_request.errors_count,
-                "error_urls": processing_request.error_urls,
-            }
+        # progress aggregated from chunk tasks, missing if it has expired
+        progress = ProcessingProgress(
+            redis_client=storage_client,
+            request_id=processing_request.id,
+            conf=current_app.config["FILE_PROCESSING"],
+        ).get()
+
+        if progress:
+            return progress
+
+    status_info: FileProcessingTaskResponse = {
+        "status": processing_request.status.value,
+        "processed": processing_request.processed_count,
+        "total": processing_request.total_count,
+        "errors": {
+            "count": processing_request.errors_count,
         }
+    }
+
+    return status_info
+
+
+def handle_get_processing_errors(
+    request_id: int,
+    cursor: Optional[int],
+    limit: int,
+) -> schemas.ProcessingErrorListSchema:
+    """Handle request for invalid lines of the processing request after the `cursor` line number."""
+    if not db.get_file_processing_request_by_id(request_id):
+        raise exceptions.NotFoundError
 
-        return status_info
+    errors = db.get_processing_errors(request_id=request_id, cursor=cursor, limit=limit)
+
+    # a full page means there may be more errors after its last line
+    next_cursor = errors[-1].line_number if len(errors) == limit else None
+    next_link = url_for(
+        'main.get_processing_request_errors', request_id=request_id, cursor=next_cursor, limit=limit,
+    ) if next_cursor is not None else None
+
+    return schemas.ProcessingErrorListSchema(
+        items=[
+            {"line_number": error.line_number, "line": error.line, "reason": error.reason}
+            for error in errors
+        ],
+        next_cursor=next_cursor,
+        links={"next": next_link},
+    )
 
 
 def handle_get_resources_with_filters(
@@ -132,6 +252,62 @@ def handle_get_resources_with_filters(
     return paginated_resources_with_meta_data
 
 
+def handle_get_resources_payload(
+    domain_zone: Optional[str],
+    availability: Optional[str],
+    resource_id: Optional[int],
+    uuid: Optional[str],
+    page: Optional[int],
+    per_page: Optional[int],
+    fields: Optional[Sequence[str]] = None,
+) -> dict:
+    """
+    Same as `handle_get_resources_with_filters`, but the payload of `PaginatedResourceListSchema`
+    is built from DB rows directly for the fast serializer. Only `fields` of items are selected
+    from DB and returned if given.
+    """
+    query = db.get_web_resources_query(
+        left_join=True,
+        domain_zone=domain_zone,
+        resource_id=resource_id,
+        resource_uuid=uuid,
+        is_available=availability,
+        fields=fields,
+    )
+
+    # keep sparse fieldset in pagination links
+    link_params = {"fields": ",".join(fields)} if fields else {}
+    paginated_rows = db.paginate_query(
+        query,
+        page,
+        per_page,
+        'main.get_resources',
+        as_dict=False,
+        **link_params,
+    )
+
+    return serializers.resource_list(
+        rows=paginated_rows["items"],
+        meta=paginated_rows["_meta"],
+        links=paginated_rows["_links"],
+        fields=fields,
+    )
+
+
+def handle_get_resource_page_payload(resource_uuid: str) -> dict:
+    """Same as `handle_get_resource_data`, but the payload of `ResourcePageSchema` is built directly."""
+    page = db.get_resource_page(resource_uuid=resource_uuid)
+    resource: models.WebResource = page[0][0]
+
+    events = [
+        {"event_type": news_item.event_type.value, "timestamp": news_item.timestamp}
+        for _, news_item, _ in page
+        if news_item
+    ]
+
+    return serializers.resource_page(resource=resource, events=events)
+
+
 def handle_get_resource_data(resource_uuid: str) -> schemas.ResourcePageSchema:
 
     # TODO: refactor!!!
@@ -151,7 +327,9 @@ def handle_get_resource_data(resource_uuid: str) -> schemas.ResourcePageSchema:
                 events.append(news_dict)
 
         resource_page = schemas.ResourcePageSchema(
-            **resource.__dict__, events=events,
+            **resource.__dict__,
+            screenshot_urls=serializers.screenshot_urls(resource),
+            events=events,
         )
 
         return resource_page
@@ -175,3 +353,47 @@ def handle_get_news_feed() -> schemas.NewsFeedSchema:
     ]
 
     return schemas.NewsFeedSchema(feed_items=feed_items)
+
+
+def handle_get_check_runs(page: Optional[int], per_page: Optional[int]) -> schemas.PaginatedCheckRunListSchema:
+    """Handle request for getting check runs with progress, the latest first."""
+    paginated_runs = db.paginate_query(
+        db.get_check_runs_query(),
+        page,
+        per_page,
+        'main.get_check_runs',
+    )
+
+    return schemas.PaginatedCheckRunListSchema(
+        items=paginated_runs["items"],
+        meta=paginated_runs.get('_meta'),
+        links=paginated_runs.get('_links'),
+    )
+
+
+def handle_get_check_run(run_id: int) -> schemas.CheckRunSchema:
+    run = db.get_check_run_by_id(run_id)
+    return schemas.CheckRunSchema(
+        **{column.name: getattr(run, column.name) for column in models.CheckRun.__table__.columns}
+    )
+
+
+def handle_get_resource_latency(resource_uuid: str, days: int) -> schemas.ResourceLatencySchema:
+    """Handle request for latency percentiles of the resource estimated from daily histograms."""
+    resource = db.get_resource_by_uuid(resource_uuid)
+    histograms = db.get_latency_histograms(resource_id=resource.id, days=days)
+
+    def percentiles(histogram: dict) -> schemas.LatencyPercentilesSchema:
+        return schemas.LatencyPercentilesSchema(
+            probes=sum(histogram.values()),
+            p50=latency.percentile(histogram, 0.5),
+            p95=latency.percentile(histogram, 0.95),
+            p99=latency.percentile(histogram, 0.99),
+        )
+
+    return schemas.ResourceLatencySchema(
+        uuid=resource.uuid,
+        window_days=days,
+        ttfb_ms=percentiles(histograms.get("ttfb", {})),
+        total_ms=percentiles(histograms.get("total", {})),
+    )
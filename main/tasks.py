@@ -1,22 +1,28 @@
-import json
-from typing import List, Optional, TypedDict
-
-import requests
-from celery import current_task, shared_task
+import csv
+import random
+import time
+import zipfile
+from collections import defaultdict
+from dataclasses import replace
+from typing import Iterable, List, Optional, TypedDict
+
+from celery import chord, current_task, shared_task
+from flask import current_app
 from pydantic import ValidationError
 from redis import Redis
+from sqlalchemy import Row
 
-from main import app
+from main import metrics
 from main.db import schemas
-from main.db.models import NewsFeedItem, StatusOption
+from main.db.models import CheckRun, StatusOption
 from main.service import db
-from main.utils import ziploader
+from main.utils import images, ziploader
+from main.utils.checker import Checker, CheckerStats, DeadHostCache
 
 
 class FileProcessingErrorsDict(TypedDict):
     """Class that represent `errors` field in result of file processing."""
     count: int
-    error_urls: Optional[List[str]]
 
 
 class FileProcessingTaskResponse(TypedDict):
@@ -27,44 +33,243 @@ class FileProcessingTaskResponse(TypedDict):
     errors: FileProcessingErrorsDict
 
 
+def next_check_interval(check_interval: Optional[int], status_changed: bool, conf: dict) -> int:
+    """
+    Adapt check interval of a resource: start over from the min interval when availability changed
+    (flapping resources are checked more often), otherwise back off up to the max interval.
+    """
+    if check_interval is None:
+        return conf["DEFAULT_INTERVAL"]
+
+    if status_changed:
+        return conf["MIN_INTERVAL"]
+
+    return min(int(check_interval * conf["BACKOFF_FACTOR"]), conf["MAX_INTERVAL"])
+
+
+def check_resource(resource: Row, checker: Checker, schedule_conf: dict) -> bool:
+    """
+    Request resource, save its status and schedule the next check.
+    Return False if the resource was skipped because the run deadline is exceeded.
+    """
+    result = checker.probe(resource.full_url)
+    if result is None:
+        return False
+
+    if result.timed_out:
+        metrics.CHECKER_TIMEOUTS.inc()
+    if result.fast_failed:
+        metrics.CHECKER_FAST_FAILS.inc()
+    metrics.CHECKER_PROBES.inc(result="available" if result.is_available else "unavailable")
+
+    # news feed item is added if status has changed from the last time
+    status_changed = resource.last_availability != result.is_available
+    if status_changed:
+        metrics.CHECKER_STATUS_CHANGES.inc()
+
+    # spread next checks of resources checked together over time
+    check_interval = next_check_interval(resource.check_interval, status_changed, schedule_conf)
+    jitter = schedule_conf["JITTER"]
+
+    db.save_check_result(
+        resource_id=resource.id,
+        status_code=result.status_code,
+        is_available=result.is_available,
+        status_changed=status_changed,
+        check_interval=check_interval,
+        delay=check_interval * random.uniform(1 - jitter, 1 + jitter),
+        ttfb_ms=result.ttfb_ms,
+        total_ms=result.total_ms,
+    )
+    return True
+
+
+def make_checker() -> Checker:
+    conf = current_app.config["CHECKER"]
+    return Checker(
+        connect_timeout=conf["CONNECT_TIMEOUT"],
+        read_timeout=conf["READ_TIMEOUT"],
+        deadline=conf["RUN_DEADLINE"],
+        probe_mode=conf["PROBE_MODE"],
+        follow_redirects=conf["FOLLOW_REDIRECTS"],
+        max_redirects=conf["MAX_REDIRECTS"],
+        pool_connections=conf["POOL_CONNECTIONS"],
+        pool_maxsize=conf["POOL_MAXSIZE"],
+        preflight=conf["PREFLIGHT"],
+        dead_hosts=DeadHostCache(
+            redis_client=current_app.extensions["redis"],
+            key_prefix=conf["DEAD_HOSTS"]["KEY_PREFIX"],
+            ttl=conf["DEAD_HOSTS"]["TTL"],
+        ),
+    )
+
+
+class RunCheckpoint:
+    """Saves progress of a check run every `every` checked resources or `interval` seconds."""
+
+    def __init__(self, run: CheckRun, stats: CheckerStats, every: int, interval: float):
+        self.run = run
+        self.stats = stats
+        self.every = every
+        self.interval = interval
+        self.last_resource_id: Optional[int] = None
+        self._pending = 0
+        self._saved_stats = replace(stats)
+        self._saved_at = time.perf_counter()
+
+    def advance(self, resource_id: int) -> None:
+        self.last_resource_id = resource_id
+        self._pending += 1
+        if self._pending >= self.every or time.perf_counter() - self._saved_at >= self.interval:
+            self.save()
+
+    def save(self, status: Optional[StatusOption] = None) -> None:
+        now = time.perf_counter()
+        db.checkpoint_check_run(
+            run=self.run,
+            last_resource_id=self.last_resource_id,
+            checked_count=self._pending,
+            timeouts_count=self.stats.timeouts - self._saved_stats.timeouts,
+            fast_failed_count=self.stats.fast_failed - self._saved_stats.fast_failed,
+            bytes_received=self.stats.bytes_received - self._saved_stats.bytes_received,
+            elapsed_seconds=now - self._saved_at,
+            status=status,
+        )
+        self._pending = 0
+        self._saved_stats = replace(self.stats)
+        self._saved_at = now
+
+
+def _check_resources(resources: Iterable[Row], checker: Checker, checkpoint: Optional[RunCheckpoint] = None) -> dict:
+    """
+    Check resources until the checker deadline. After the deadline remaining rows are only counted
+    as skipped (claimed resources become due again when their lease expires), or iteration stops
+    if progress is checkpointed to be resumed.
+    """
+    schedule_conf = current_app.config["PERIODIC_TASKS"]["SCHEDULE_CHECKS"]
+    started = time.perf_counter()
+    checked_count = 0
+
+    for resource in resources:
+        if not check_resource(resource=resource, checker=checker, schedule_conf=schedule_conf):
+            if checkpoint is not None:
+                break
+            continue
+
+        checked_count += 1
+        if checkpoint is not None:
+            checkpoint.advance(resource.id)
+
+    elapsed = time.perf_counter() - started
+    if elapsed > 0:
+        metrics.CHECKER_PROBE_RATE.set(checked_count / elapsed)
+    metrics.CHECKER_SKIPPED.inc(checker.stats.skipped)
+    metrics.CHECKER_BYTES.inc(checker.stats.bytes_received)
+    metrics.CHECKER_PREFLIGHTS.inc(checker.stats.preflights - checker.stats.preflight_failures, result="succeeded")
+    metrics.CHECKER_PREFLIGHTS.inc(checker.stats.preflight_failures, result="failed")
+
+    stats = checker.stats.as_dict()
+    current_app.logger.info(
+        f"Checker run finished in {elapsed:.1f} s: {stats['probed']} probed, {stats['timeouts']} timed out, "
+        f"{stats['fast_failed']} fast failed on dead hosts (probes saved), {stats['skipped']} skipped by deadline, "
+        f"{stats['preflights']} host preflights ({stats['preflight_failures']} failed), "
+        f"{stats['bytes_received']} bytes received"
+    )
+    return stats
+
+
 @shared_task
 def get_response_from_resources():
-    """Get all urls from DB, make requests and write response status codes to DB."""
+    """
+    Get all urls from DB, make requests and write response status codes to DB.
+    Progress is checkpointed in a check run: a run stopped by the deadline is continued by the next
+    task right away, a run interrupted by a worker restart is resumed by the next invocation.
+    """
+    conf = current_app.config["CHECKER"]
+
+    run = db.claim_check_run(stale_after=conf["RUNS"]["STALE_AFTER"])
+    if run is None:
+        current_app.logger.info("Check run is already in process, skip")
+        return None
+
+    resources = db.iter_resources_to_check(after_id=run.last_resource_id, batch_size=conf["STREAM_BATCH_SIZE"])
+
+    with make_checker() as checker:
+        checkpoint = RunCheckpoint(
+            run=run,
+            stats=checker.stats,
+            every=conf["RUNS"]["CHECKPOINT_EVERY"],
+            interval=conf["RUNS"]["CHECKPOINT_INTERVAL"],
+        )
+        try:
+            stats = _check_resources(resources, checker=checker, checkpoint=checkpoint)
+        except Exception:
+            db.rollback()
+            checkpoint.save(status=StatusOption.FAILED)
+            raise
 
-    # for future: distribute all urls between multiple celery workers.
+    if checker.stats.skipped:
+        checkpoint.save(status=StatusOption.PENDING)
+        get_response_from_resources.delay()
+    else:
+        checkpoint.save(status=StatusOption.SUCCEEDED)
 
-    resources_from_db = db.get_web_resources_query().all()
+    return stats
 
-    for resource in resources_from_db:
 
-        last_availability = resource.status_codes[-1].is_available if resource.status_codes else None
+@shared_task
+def check_resources(resource_ids: List[int]):
+    """Check resources with the given IDs claimed by the scheduler."""
+    batch_size = current_app.config["CHECKER"]["STREAM_BATCH_SIZE"]
+    with make_checker() as checker:
+        return _check_resources(
+            db.iter_resources_to_check(resource_ids=resource_ids, order_by_domain=True, batch_size=batch_size),
+            checker=checker,
+        )
 
-        try:
-            response = requests.get(resource.full_url)
-            status_code = response.status_code
-            is_available = True if status_code in range(200, 400) else False
-
-        except requests.RequestException:
-            is_available = False
-            status_code = 404
-
-        finally:
-            db.update_counter_for_resource_availability(
-                resource=resource,
-                is_available=is_available
-            )
-            db.save_status_code_for_web_resource_response(
-                resource=resource,
-                status_code=response.status_code,
-                is_available=is_available,
-            )
-
-            # add newsfeed item if status has changed from the last time
-            if last_availability != is_available:
-                db.create_newsfeed_item(
-                    resource=resource,
-                    event=NewsFeedItem.EventType.STATUS_CHANGED,
-                )
+
+def chunk_by_domain(resources: List[Row], chunk_size: int) -> List[List[int]]:
+    """
+    Split resource IDs into chunks of at most `chunk_size` keeping resources of one domain in
+    one chunk where possible, so that a domain is preflighted by one checker task.
+    """
+    ids_by_domain = defaultdict(list)
+    for resource in resources:
+        ids_by_domain[resource.domain].append(resource.id)
+
+    chunks = []
+    chunk = []
+    for domain_ids in sorted(ids_by_domain.values(), key=len, reverse=True):
+        for start in range(0, len(domain_ids), chunk_size):
+            part = domain_ids[start:start + chunk_size]
+            if len(chunk) + len(part) > chunk_size:
+                chunks.append(chunk)
+                chunk = []
+            chunk.extend(part)
+
+    if chunk:
+        chunks.append(chunk)
+    return chunks
+
+
+@shared_task
+def schedule_due_checks():
+    """
+    Claim resources due for a check and distribute them between checker tasks grouped by domain.
+    Chunks are delayed evenly within the tick interval so that probes do not come in bursts.
+    """
+    conf = current_app.config["PERIODIC_TASKS"]["SCHEDULE_CHECKS"]
+
+    resources = db.claim_due_resources(limit=conf["BATCH_SIZE"], lease_seconds=conf["CLAIM_LEASE"])
+    chunks = chunk_by_domain(resources, chunk_size=conf["CHUNK_SIZE"])
+
+    for number, chunk in enumerate(chunks):
+        check_resources.apply_async(
+            kwargs=dict(resource_ids=chunk),
+            countdown=conf["TICK_SECONDS"] * number / len(chunks),
+        )
+
+    metrics.CHECKER_DUE_RESOURCES.set(db.count_due_resources())
 
 
 @shared_task
@@ -78,83 +283,215 @@ def delete_unavailable_resources(unavailable_count: int):
 
 
 @shared_task
-def process_urls_from_zip_archive(zip_file: bytes, request_id: int):
+def make_screenshot_variants(resource_id: int) -> bool:
+    """Make resized and recompressed variants of the resource screenshot listed in `SCREENSHOTS.VARIANTS`."""
+    conf = current_app.config["SCREENSHOTS"]
+    screenshot = db.get_screenshot(resource_id)
+    if screenshot is None:
+        return False
+
+    variants = {
+        name: images.make_variant(
+            screenshot.screenshot,
+            max_size=tuple(size),
+            image_format=conf["FORMAT"],
+            quality=conf["QUALITY"],
+        )
+        for name, size in conf["VARIANTS"].items()
+    }
+    saved = db.save_screenshot_variants(resource_id, screenshot.screenshot_updated_at, variants)
+    if not saved:
+        current_app.logger.info(f"Screenshot of resource {resource_id} was replaced, variants are not saved")
+    return saved
+
+
+class ProcessingProgress:
     """
-    Celery task that processes urls from the file.
-    This task iterates over the lines of the file and writes the result in redis on each step.
-    At the end of processing it saves the final result in DB.
+    Progress of a file processing request aggregated from its chunk tasks in a redis hash.
+    Tasks are acknowledged late and may be redelivered, so every chunk is counted once (marked
+    by a `chunk:<first line number>` field) and the chord is dispatched once (`dispatched` field).
     """
 
-    # get celery task ID
-    task_id = current_task.request.id
+    # counters are added only by the first run of a chunk and only while the progress exists
+    ADD_CHUNK_SCRIPT = """
+        if redis.call('EXISTS', KEYS[1]) == 0 then
+            return 0
+        end
+        if redis.call('HSETNX', KEYS[1], 'chunk:' .. ARGV[1], 1) == 0 then
+            return 0
+        end
+        redis.call('HINCRBY', KEYS[1], 'processed', ARGV[2])
+        redis.call('HINCRBY', KEYS[1], 'errors', ARGV[3])
+        return 1
+    """
 
-    lines_from_csv = ziploader.get_lines_from_csv(zip_file=zip_file)
+    def __init__(self, redis_client: Redis, request_id: int, conf: dict):
+        self.redis_client = redis_client
+        self.key = f"{conf['PROGRESS_KEY_PREFIX']}:{request_id}"
+        self.ttl = conf["PROGRESS_TTL"]
+
+    def start(self, total: int) -> None:
+        pipeline = self.redis_client.pipeline()
+        pipeline.delete(self.key)
+        pipeline.hset(self.key, mapping={
+            "status": StatusOption.INPROCESS.value,
+            "total": total,
+            "processed": 0,
+            "errors": 0,
+            "started_at": time.time(),
+        })
+        pipeline.expire(self.key, self.ttl)
+        pipeline.execute()
+
+    def is_dispatched(self) -> bool:
+        return bool(self.redis_client.hexists(self.key, "dispatched"))
+
+    def mark_dispatched(self) -> None:
+        self.redis_client.hset(self.key, "dispatched", 1)
+
+    def add(self, chunk: int, processed: int, errors: int) -> bool:
+        """Add counters of the chunk starting at line `chunk`, return False if it was already counted."""
+        add_chunk = self.redis_client.register_script(self.ADD_CHUNK_SCRIPT)
+        return bool(add_chunk(keys=[self.key], args=[chunk, processed, errors]))
+
+    def finish(self, status: StatusOption) -> Optional[float]:
+        """Set final status and return seconds since the start."""
+        pipeline = self.redis_client.pipeline()
+        pipeline.hset(self.key, "status", status.value)
+        pipeline.hget(self.key, "started_at")
+        _, started_at = pipeline.execute()
+        return time.time() - float(started_at) if started_at else None
+
+    def get(self) -> Optional[FileProcessingTaskResponse]:
+        progress = self.redis_client.hgetall(self.key)
+        if not progress:
+            return None
+
+        return {
+            "status": progress[b"status"].decode(),
+            "total": int(progress[b"total"]),
+            "processed": int(progress[b"processed"]),
+            "errors": {
+                "count": int(progress[b"errors"]),
+            },
+        }
 
-    processing_request = db.get_file_processing_request_by_id(request_id=request_id)
 
-    # initialize counters
-    total_lines_number = len(lines_from_csv)
-    processed_count = 0
-    errors_count = 0
-    error_urls = []
+def make_processing_progress(request_id: int) -> ProcessingProgress:
+    return ProcessingProgress(
+        redis_client=current_app.extensions["redis"],
+        request_id=request_id,
+        conf=current_app.config["FILE_PROCESSING"],
+    )
 
-    validated_urls: List[str] = []
 
-    redis_client: Redis = app.extensions["redis"]
+@shared_task
+def process_urls_from_zip_archive(zip_file: bytes, request_id: int):
+    """
+    Celery task that splits lines of all CSV files of the archive into chunks of
+    `FILE_PROCESSING.CHUNK_SIZE` lines, processed in parallel as a chord by `process_urls_chunk`.
+    Chunks add their counters to the progress in redis, `finish_processing_request` saves the final result in DB.
+    """
+    processing_request = db.get_file_processing_request_by_id(request_id=request_id)
+    progress = make_processing_progress(request_id)
 
-    # put initial processing result with zeros in redis
-    task_response: FileProcessingTaskResponse = {
-        "status": StatusOption.INPROCESS.value,
-        "total": total_lines_number,
-        "processed": processed_count,
-        "errors": {
-            "count": errors_count,
-            "error_urls": error_urls
-        }
-    }
+    # redelivered after the chord was dispatched (the task is acknowledged late)
+    if processing_request.status in (StatusOption.SUCCEEDED, StatusOption.FAILED) or progress.is_dispatched():
+        current_app.logger.info(f"Chunks of file processing request {request_id} are already queued")
+        return
 
-    task_response_json = json.dumps(task_response)
-    redis_client.set(name=task_id, value=task_response_json)
+    try:
+        lines_from_csv = ziploader.get_lines_from_csv(zip_file=zip_file)
+    except (ValueError, zipfile.BadZipFile, UnicodeDecodeError, csv.Error) as e:
+        current_app.logger.warning(f"File processing request {request_id} failed: {e}")
+        db.update_processing_request(processing_request=processing_request, status=StatusOption.FAILED)
+        return
 
+    progress.start(total=len(lines_from_csv))
     db.update_processing_request(
         processing_request=processing_request,
         status=StatusOption.INPROCESS,
-        task_id=task_id,
+        task_id=current_task.request.id,
+        total_count=len(lines_from_csv),
     )
 
-    for line in lines_from_csv:
+    chunk_size = current_app.config["FILE_PROCESSING"]["CHUNK_SIZE"]
+    header = [
+        process_urls_chunk.s(
+            request_id=request_id,
+            lines=lines_from_csv[start:start + chunk_size],
+            first_line_number=start + 1,
+        )
+        for start in range(0, len(lines_from_csv), chunk_size)
+    ]
+    if not header:
+        finish_processing_request.delay([], request_id=request_id)
+        return
+
+    callback = finish_processing_request.s(request_id=request_id).on_error(
+        fail_processing_request.si(request_id=request_id),
+    )
+    chord(header)(callback)
+    progress.mark_dispatched()
 
+
+@shared_task(ignore_result=False)
+def process_urls_chunk(request_id: int, lines: List[str], first_line_number: int = 1) -> FileProcessingErrorsDict:
+    """
+    Validate lines and save valid URLs skipping existing ones.
+    Invalid lines are saved with their numbers in the archive and validation error types as reasons.
+    """
+    validated_urls: List[str] = []
+    errors: List[dict] = []
+
+    for line_number, line in enumerate(lines, start=first_line_number):
         try:
             # try to validate url and add it to list with valid urls for further bulk create in db
             validated_url = schemas.ResourceCreateRequestSchema.parse_obj({"url": line})
             validated_urls.append(validated_url.url)
+        except ValidationError as e:
+            errors.append({"line_number": line_number, "line": line, "reason": e.errors()[0]["type"]})
 
-        except ValidationError:
-            # increment counter is URL is invalid
-            errors_count += 1
-            error_urls.append(line)
+    db.bulk_create_web_resources(validated_urls=validated_urls)
+    db.bulk_create_processing_errors(request_id=request_id, errors=errors)
 
-        finally:
-            processed_count += 1
+    # URLs and errors are inserted skipping existing rows, so only counters need a guard against redelivery
+    if make_processing_progress(request_id).add(chunk=first_line_number, processed=len(lines), errors=len(errors)):
+        metrics.INGESTION_LINES.inc(len(validated_urls), result="valid")
+        metrics.INGESTION_LINES.inc(len(errors), result="invalid")
 
-        # update fields in response for redis
-        task_response["processed"] = processed_count
-        task_response["errors"]["count"] = errors_count
-        task_response["errors"]["error_urls"] = error_urls
+    return {"count": len(errors)}
 
-        # сonvert task response dictionary to JSON
-        task_response_json = json.dumps(task_response)
 
-        # set task response JSON in Redis
-        redis_client.set(name=task_id, value=task_response_json)
+@shared_task
+def finish_processing_request(chunk_errors: List[FileProcessingErrorsDict], request_id: int):
+    """Chord callback that saves the result of all chunks of the file processing request in DB."""
+    processing_request = db.get_file_processing_request_by_id(request_id=request_id)
 
-    db.bulk_create_web_resources(validated_urls=validated_urls)
+    elapsed = make_processing_progress(request_id).finish(StatusOption.SUCCEEDED)
+    total = processing_request.total_count or 0
+    if elapsed:
+        metrics.INGESTION_LINE_RATE.set(total / elapsed)
 
     db.update_processing_request(
         processing_request=processing_request,
-        total_count=total_lines_number,
-        processed_count=processed_count,
-        errors_count=errors_count,
-        error_urls=error_urls,
+        processed_count=total,
+        errors_count=sum(errors["count"] for errors in chunk_errors),
         status=StatusOption.SUCCEEDED,
     )
+
+
+@shared_task
+def fail_processing_request(request_id: int):
+    """Error callback of the chord: some chunk failed, URLs and errors of other chunks stay saved."""
+    processing_request = db.get_file_processing_request_by_id(request_id=request_id)
+    progress = make_processing_progress(request_id)
+    current_progress = progress.get()
+    progress.finish(StatusOption.FAILED)
+
+    db.update_processing_request(
+        processing_request=processing_request,
+        processed_count=current_progress["processed"] if current_progress else None,
+        errors_count=current_progress["errors"]["count"] if current_progress else None,
+        status=StatusOption.FAILED,
+    )
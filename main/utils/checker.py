@@ -0,0 +1,402 @@
+"""
+Availability probes of web resources with timeouts, a run deadline and a negative cache of dead hosts.
+
+In `head` probe mode a resource is requested with HEAD, and with a streamed GET closed right after
+the headers if HEAD is not allowed (405/501), so response bodies are never downloaded. `get` mode
+downloads the whole response as before. Connections are pooled per host for the whole run and
+DNS results are cached while the checker is open. The cache is used by the connection pools of the
+checker session only, other code in the process (Redis, Postgres, celery broker) resolves hosts as usual.
+
+With preflight enabled, the first URL of every host in a run is preceded by a single DNS resolution
+and TCP connect to the host. Hosts that failed the preflight, DNS resolution or TCP connect are
+remembered in Redis for `ttl` seconds, so all URLs on the same host (in this and other checker
+tasks) fail fast without individual requests.
+"""
+import logging
+import socket
+import threading
+import time
+from contextlib import ExitStack
+from dataclasses import dataclass, field
+from functools import partial
+from typing import Dict, List, Optional, Set, Tuple
+from urllib.parse import urlparse
+
+import requests
+from redis import Redis, RedisError
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import ConnectTimeoutError, NewConnectionError
+from urllib3.util.connection import allowed_gai_family
+
+logger = logging.getLogger(__name__)
+
+# status code saved for resources that did not respond
+NO_RESPONSE_STATUS_CODE = 404
+
+PROBE_MODES = ("head", "get")
+
+# HEAD is not supported by the server
+HEAD_REJECTED_STATUS_CODES = (405, 501)
+
+
+@dataclass
+class ProbeResult:
+    status_code: int
+    is_available: bool
+    timed_out: bool = False
+    fast_failed: bool = False
+    ttfb_ms: Optional[int] = None
+    total_ms: Optional[int] = None
+
+
+@dataclass
+class CheckerStats:
+    probed: int = 0
+    timeouts: int = 0
+    fast_failed: int = 0
+    skipped: int = 0
+    bytes_received: int = 0
+    preflights: int = 0
+    preflight_failures: int = 0
+
+    def as_dict(self) -> dict:
+        return {
+            "probed": self.probed,
+            "timeouts": self.timeouts,
+            "fast_failed": self.fast_failed,
+            "skipped": self.skipped,
+            "bytes_received": self.bytes_received,
+            "preflights": self.preflights,
+            "preflight_failures": self.preflight_failures,
+        }
+
+
+def host_key(url: str) -> str:
+    parsed = urlparse(url)
+    port = parsed.port or (443 if parsed.scheme == "https" else 80)
+    hostname = (parsed.hostname or "").lower()
+    # IPv6 literals are kept in brackets, so the port is split off unambiguously
+    if ":" in hostname:
+        hostname = f"[{hostname}]"
+    return f"{hostname}:{port}"
+
+
+def split_host_key(host: str) -> Tuple[str, int]:
+    """Hostname (without IPv6 brackets) and port of `host_key` result."""
+    hostname, _, port = host.rpartition(":")
+    return hostname.strip("[]"), int(port)
+
+
+def is_host_failure(error: requests.RequestException) -> bool:
+    """Whether request failed to resolve the host or to open a TCP connection to it."""
+    if isinstance(error, requests.ConnectTimeout):
+        return True
+    if not isinstance(error, requests.ConnectionError) or isinstance(error, requests.exceptions.SSLError):
+        return False
+
+    # requests wraps urllib3 MaxRetryError, DNS failures are NewConnectionError (or its subclass)
+    reason = getattr(error.args[0], "reason", None) if error.args else None
+    return isinstance(reason, (NewConnectionError, ConnectTimeoutError))
+
+
+def response_size(response: requests.Response, body: bool) -> int:
+    """Approximate bytes received for the response and redirects before it: headers and optionally body."""
+    size = 0
+    for item in [*response.history, response]:
+        # status line and header lines with CRLF
+        size += len(f"HTTP/1.1 {item.status_code} {item.reason or ''}") + 2
+        size += sum(len(name) + len(value) + 4 for name, value in item.headers.items()) + 2
+    if body:
+        size += len(response.content)
+    return size
+
+
+class DNSCache:
+    """Resolved addresses of hosts, shared by the connections of one checker."""
+
+    def __init__(self):
+        self._addresses: Dict[str, List[str]] = {}
+        self._lock = threading.Lock()
+
+    def resolve(self, hostname: str, port: int) -> List[str]:
+        """Addresses of `hostname` in resolver order, raises `socket.gaierror` if it can't be resolved."""
+        with self._lock:
+            addresses = self._addresses.get(hostname)
+        if addresses is not None:
+            return addresses
+
+        infos = socket.getaddrinfo(hostname, port, allowed_gai_family(), socket.SOCK_STREAM)
+        addresses = list(dict.fromkeys(sockaddr[0] for *_, sockaddr in infos))
+        with self._lock:
+            self._addresses[hostname] = addresses
+        return addresses
+
+    def clear(self) -> None:
+        with self._lock:
+            self._addresses.clear()
+
+
+class _CachedDNSConnectionMixin:
+    """Opens the socket to an address from `dns_cache`, TLS still verifies the hostname."""
+
+    dns_cache: Optional[DNSCache] = None
+
+    def _new_conn(self):
+        if self.dns_cache is None:
+            return super()._new_conn()
+
+        hostname = self._dns_host
+        try:
+            addresses = self.dns_cache.resolve(hostname, self.port)
+        except socket.gaierror as e:
+            raise NewConnectionError(self, f"Failed to resolve {hostname}: {e}") from e
+
+        error = None
+        for address in addresses:
+            self._dns_host = address
+            try:
+                return super()._new_conn()
+            except ConnectTimeoutError as e:
+                # NewConnectionError is a subclass, the next address is tried like by the system resolver
+                error = e
+            finally:
+                self._dns_host = hostname
+        raise error
+
+
+class _CachedDNSHTTPConnection(_CachedDNSConnectionMixin, HTTPConnection):
+    pass
+
+
+class _CachedDNSHTTPSConnection(_CachedDNSConnectionMixin, HTTPSConnection):
+    pass
+
+
+class _CachedDNSPoolMixin:
+    def __init__(self, *args, dns_cache: DNSCache, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.dns_cache = dns_cache
+
+    def _new_conn(self):
+        conn = super()._new_conn()
+        conn.dns_cache = self.dns_cache
+        return conn
+
+
+class _CachedDNSHTTPConnectionPool(_CachedDNSPoolMixin, HTTPConnectionPool):
+    ConnectionCls = _CachedDNSHTTPConnection
+
+
+class _CachedDNSHTTPSConnectionPool(_CachedDNSPoolMixin, HTTPSConnectionPool):
+    ConnectionCls = _CachedDNSHTTPSConnection
+
+
+class CachedDNSAdapter(HTTPAdapter):
+    """`HTTPAdapter` resolving hosts through `dns_cache` instead of patching the process-wide resolver."""
+
+    def __init__(self, dns_cache: DNSCache, **kwargs):
+        # set before `HTTPAdapter.__init__`, which creates the pool manager
+        self.dns_cache = dns_cache
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": partial(_CachedDNSHTTPConnectionPool, dns_cache=self.dns_cache),
+            "https": partial(_CachedDNSHTTPSConnectionPool, dns_cache=self.dns_cache),
+        }
+
+
+class DeadHostCache:
+    """TTL-bounded set of dead hosts shared through Redis with a per-run local copy."""
+
+    def __init__(self, redis_client: Redis, key_prefix: str, ttl: int):
+        self.redis_client = redis_client
+        self.key_prefix = key_prefix
+        self.ttl = ttl
+        self._known_dead: Set[str] = set()
+
+    def _key(self, host: str) -> str:
+        return f"{self.key_prefix}:{host}"
+
+    def is_dead(self, host: str) -> bool:
+        if host in self._known_dead:
+            return True
+        try:
+            dead = bool(self.redis_client.exists(self._key(host)))
+        except RedisError:
+            return False
+        if dead:
+            self._known_dead.add(host)
+        return dead
+
+    def mark_dead(self, host: str) -> None:
+        self._known_dead.add(host)
+        try:
+            self.redis_client.set(self._key(host), 1, ex=self.ttl)
+        except RedisError:
+            logger.warning(f"Could not save dead host {host} in redis")
+
+
+@dataclass
+class Checker:
+    """
+    Probes URLs within `deadline` seconds from creation, a URL is requested only if the rest of the run
+    fits its full connect and read timeouts.
+    Use as a context manager to pool connections and cache DNS for the whole run.
+    """
+
+    connect_timeout: float
+    read_timeout: float
+    deadline: float
+    dead_hosts: DeadHostCache
+    probe_mode: str = "head"
+    follow_redirects: bool = True
+    max_redirects: int = 5
+    pool_connections: int = 100
+    pool_maxsize: int = 10
+    preflight: bool = True
+    stats: CheckerStats = field(default_factory=CheckerStats)
+    _deadline_at: float = field(init=False)
+    _session: requests.Session = field(init=False)
+    _dns_cache: DNSCache = field(init=False)
+
+    def __post_init__(self):
+        if self.probe_mode not in PROBE_MODES:
+            raise ValueError(f"Unknown probe mode: {self.probe_mode}")
+
+        self._deadline_at = time.monotonic() + self.deadline
+
+        self._session = requests.Session()
+        self._session.max_redirects = self.max_redirects
+        self._dns_cache = DNSCache()
+        adapter = CachedDNSAdapter(
+            self._dns_cache, pool_connections=self.pool_connections, pool_maxsize=self.pool_maxsize,
+        )
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+        self._exit_stack = ExitStack()
+        self._preflight_results: Dict[str, bool] = {}
+
+    def __enter__(self) -> "Checker":
+        self._exit_stack.callback(self._session.close)
+        self._exit_stack.callback(self._dns_cache.clear)
+        return self
+
+    def __exit__(self, *exc_info):
+        self._exit_stack.close()
+
+    def remaining(self) -> float:
+        return self._deadline_at - time.monotonic()
+
+    def deadline_exceeded(self) -> bool:
+        """Whether the rest of the run can't fit a request with full connect and read timeouts."""
+        return self.remaining() < self.connect_timeout + self.read_timeout
+
+    def skip(self, count: int = 1) -> None:
+        self.stats.skipped += count
+
+    def _preflight(self, host: str) -> Optional[bool]:
+        """
+        Resolve host and open a TCP connection to it once per run.
+        Return None if the rest of the run can't fit a full connect timeout, the host is not checked then.
+        """
+        if host in self._preflight_results:
+            return self._preflight_results[host]
+        if self.remaining() < self.connect_timeout:
+            return None
+
+        hostname, port = split_host_key(host)
+        self.stats.preflights += 1
+        try:
+            self._connect(hostname, port, timeout=self.connect_timeout)
+            succeeded = True
+        except OSError:
+            succeeded = False
+            self.stats.preflight_failures += 1
+
+        self._preflight_results[host] = succeeded
+        return succeeded
+
+    def _connect(self, hostname: str, port: int, timeout: float) -> None:
+        """Open and close a TCP connection to the first reachable address of the host (from the DNS cache)."""
+        error = None
+        for address in self._dns_cache.resolve(hostname, port):
+            try:
+                with socket.create_connection((address, port), timeout=timeout):
+                    return
+            except OSError as e:
+                error = e
+        raise error
+
+    def _request(self, url: str, timeout: tuple) -> requests.Response:
+        if self.probe_mode == "get":
+            response = self._session.get(url, timeout=timeout, allow_redirects=self.follow_redirects)
+            self.stats.bytes_received += response_size(response, body=True)
+            return response
+
+        response = self._session.head(url, timeout=timeout, allow_redirects=self.follow_redirects)
+        self.stats.bytes_received += response_size(response, body=False)
+        if response.status_code not in HEAD_REJECTED_STATUS_CODES:
+            return response
+
+        # the body is not read, closing drops the connection instead of returning it to the pool
+        response = self._session.get(url, timeout=timeout, allow_redirects=self.follow_redirects, stream=True)
+        response.close()
+        self.stats.bytes_received += response_size(response, body=False)
+        return response
+
+    def probe(self, url: str) -> Optional[ProbeResult]:
+        """
+        Request URL, return None if the URL was not requested because of the run deadline.
+        Timeouts are never shortened to the rest of the run: a timeout caused by the deadline
+        would save a healthy resource as unavailable and mark its host dead.
+        """
+        if self.deadline_exceeded():
+            self.skip()
+            return None
+
+        host = host_key(url)
+        is_dead = self.dead_hosts.is_dead(host)
+        if not is_dead and self.preflight:
+            preflight_passed = self._preflight(host)
+            if preflight_passed is None:
+                self.skip()
+                return None
+            if not preflight_passed:
+                self.dead_hosts.mark_dead(host)
+                is_dead = True
+
+        if is_dead:
+            self.stats.fast_failed += 1
+            return ProbeResult(status_code=NO_RESPONSE_STATUS_CODE, is_available=False, fast_failed=True)
+
+        # the preflight took a part of the run
+        if self.deadline_exceeded():
+            self.skip()
+            return None
+
+        self.stats.probed += 1
+        timeout = (self.connect_timeout, self.read_timeout)
+        started = time.perf_counter()
+        try:
+            response = self._request(url, timeout=timeout)
+        except requests.RequestException as e:
+            if is_host_failure(e):
+                self.dead_hosts.mark_dead(host)
+
+            timed_out = isinstance(e, requests.Timeout)
+            if timed_out:
+                self.stats.timeouts += 1
+            return ProbeResult(status_code=NO_RESPONSE_STATUS_CODE, is_available=False, timed_out=timed_out)
+
+        # `elapsed` of the first response (before redirects) is the time until its headers were parsed
+        first_response = response.history[0] if response.history else response
+        return ProbeResult(
+            status_code=response.status_code,
+            is_available=200 <= response.status_code < 400,
+            ttfb_ms=round(first_response.elapsed.total_seconds() * 1000),
+            total_ms=round((time.perf_counter() - started) * 1000),
+        )
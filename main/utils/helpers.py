@@ -1,3 +1,7 @@
+from datetime import datetime
+from typing import Optional
+
+
 def make_int(value) -> int | None:
     if value is not None:
         try:
@@ -17,3 +21,20 @@ def convert_to_serializable(value):
         return [convert_to_serializable(item) for item in value]
     else:
         return value
+
+
+def parse_datetime(value: Optional[str]) -> Optional[datetime]:
+    """Parse ISO 8601 datetime from query params. Naive values are treated as local time."""
+    if not value:
+        return None
+
+    try:
+        parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        raise ValueError(f"Invalid datetime: {value}. Use ISO 8601 format.")
+
+    if parsed.tzinfo is not None:
+        # log records are written in local time
+        parsed = parsed.astimezone().replace(tzinfo=None)
+
+    return parsed
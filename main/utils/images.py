@@ -0,0 +1,81 @@
+"""
+Resized and recompressed variants of resource screenshots.
+
+Variants fit into the given box keeping the aspect ratio and are never upscaled. WEBP keeps
+transparency, JPEG variants are flattened to RGB.
+"""
+from dataclasses import dataclass
+from io import BytesIO
+from typing import BinaryIO, Tuple
+
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+FORMATS = ("WEBP", "JPEG")
+
+# name of the uploaded screenshot among variants
+ORIGINAL = "original"
+
+READ_CHUNK_SIZE = 64 * 1024
+
+
+class UploadTooLargeError(ValueError):
+    pass
+
+
+@dataclass
+class ImageVariant:
+    content: bytes
+    mimetype: str
+    width: int
+    height: int
+
+
+def read_limited(stream: BinaryIO, max_size: int, chunk_size: int = READ_CHUNK_SIZE) -> bytes:
+    """Read stream by chunks, raise UploadTooLargeError as soon as it exceeds `max_size` bytes."""
+    buffer = BytesIO()
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            return buffer.getvalue()
+        if buffer.tell() + len(chunk) > max_size:
+            raise UploadTooLargeError(f"File is larger than {max_size} bytes")
+        buffer.write(chunk)
+
+
+def image_mimetype(data: bytes) -> str:
+    """Check that data is an image readable by Pillow and return its mimetype."""
+    try:
+        with Image.open(BytesIO(data)) as image:
+            image_format = image.format
+            image.verify()
+    except (UnidentifiedImageError, OSError, SyntaxError, Image.DecompressionBombError) as e:
+        raise ValueError("File is not a supported image") from e
+
+    return Image.MIME.get(image_format, "application/octet-stream")
+
+
+def make_variant(data: bytes, max_size: Tuple[int, int], image_format: str, quality: int) -> ImageVariant:
+    """Downscale image to fit into `max_size` (width, height) and encode it in `image_format`."""
+    if image_format not in FORMATS:
+        raise ValueError(f"Unknown variant format: {image_format}")
+
+    with Image.open(BytesIO(data)) as original:
+        # draft lets JPEG decoder skip most of the pixels of large images
+        original.draft("RGB", max_size)
+        image = ImageOps.exif_transpose(original)
+        image.thumbnail(max_size, Image.Resampling.LANCZOS)
+
+        if image_format == "JPEG" and image.mode != "RGB":
+            image = image.convert("RGB")
+        elif image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if "A" in image.getbands() or "transparency" in image.info else "RGB")
+
+        output = BytesIO()
+        image.save(output, format=image_format, quality=quality, optimize=True)
+
+    return ImageVariant(
+        content=output.getvalue(),
+        mimetype=Image.MIME.get(image_format, f"image/{image_format.lower()}"),
+        width=image.width,
+        height=image.height,
+    )
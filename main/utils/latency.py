@@ -0,0 +1,57 @@
+"""
+Log-scale latency histograms.
+
+Latency in milliseconds falls into bucket `floor(log(ms, GROWTH))`, so every bucket is `GROWTH`
+times wider than the previous one and percentiles estimated from bucket counts have a relative
+error below `GROWTH - 1`. Counts of histograms of different days are simply summed up.
+"""
+import math
+import re
+from typing import Dict, Optional, Tuple
+
+GROWTH = 1.2
+
+WINDOW_RE = re.compile(r"^(\d+)([dw]?)$")
+WINDOW_UNIT_DAYS = {"": 1, "d": 1, "w": 7}
+
+
+def bucket_for(value_ms: float) -> int:
+    return int(math.log(max(value_ms, 1.0), GROWTH))
+
+
+def bucket_bounds(bucket: int) -> Tuple[float, float]:
+    lower = 0.0 if bucket == 0 else GROWTH ** bucket
+    return lower, GROWTH ** (bucket + 1)
+
+
+def percentile(histogram: Dict[int, int], q: float) -> Optional[float]:
+    """Estimate `q` quantile (0..1) by interpolation within the bucket where it falls."""
+    total = sum(histogram.values())
+    if not total:
+        return None
+
+    rank = q * total
+    cumulative = 0
+    for bucket in sorted(histogram):
+        count = histogram[bucket]
+        if count and cumulative + count >= rank:
+            lower, upper = bucket_bounds(bucket)
+            return lower + (upper - lower) * (rank - cumulative) / count
+        cumulative += count
+
+    return bucket_bounds(max(histogram))[1]
+
+
+def parse_window(value: Optional[str], default_days: int, max_days: int) -> int:
+    """Parse window like `7`, `7d` or `2w` into days."""
+    if not value:
+        return default_days
+
+    match = WINDOW_RE.match(value.strip().lower())
+    if not match:
+        raise ValueError(f"Invalid window: {value}, expected days like 7d or weeks like 2w")
+
+    days = int(match.group(1)) * WINDOW_UNIT_DAYS[match.group(2)]
+    if not 1 <= days <= max_days:
+        raise ValueError(f"Window must be from 1 to {max_days} days")
+    return days
@@ -0,0 +1,274 @@
+"""
+Search and tail over the current and rotated log files.
+
+Every log file gets a sidecar index with byte offsets of records sampled every `index_step` bytes
+together with their timestamps, so time-range queries seek right to the needed part of the file.
+Indexes are keyed by inode, so they stay valid when `RotatingFileHandler` renames files on rollover;
+the current file is indexed incrementally as it grows.
+"""
+import bisect
+import json
+import logging
+import mmap
+import os
+import re
+import threading
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# record header produced by "%(asctime)s - %(levelname)s - %(message)s" format
+RECORD_HEADER_RE = re.compile(rb"(\d{4})-(\d{2})-(\d{2}) (\d{2}):(\d{2}):(\d{2}),(\d{3}) - ([A-Z]+) - ")
+
+# bytes from the beginning of the file used to detect inode reuse
+HEAD_SIZE = 64
+
+
+@dataclass
+class LogFileIndex:
+    """Sampled `(timestamp, offset)` pairs of record starts in a single log file."""
+    inode: int
+    head: str
+    indexed_size: int = 0
+    timestamps: List[float] = field(default_factory=list)
+    offsets: List[int] = field(default_factory=list)
+    last_timestamp: Optional[float] = None
+
+    @property
+    def first_timestamp(self) -> Optional[float]:
+        return self.timestamps[0] if self.timestamps else None
+
+    def offset_before(self, timestamp: float) -> int:
+        """Offset of the last sampled record not newer than `timestamp` (start of the file if none)."""
+        position = bisect.bisect_right(self.timestamps, timestamp) - 1
+        return self.offsets[position] if position >= 0 else 0
+
+    def offset_after(self, timestamp: float) -> int:
+        """Offset of the first sampled record newer than `timestamp` (end of indexed data if none)."""
+        position = bisect.bisect_right(self.timestamps, timestamp)
+        return self.offsets[position] if position < len(self.offsets) else self.indexed_size
+
+    def to_json(self) -> str:
+        return json.dumps({
+            "inode": self.inode,
+            "head": self.head,
+            "indexed_size": self.indexed_size,
+            "timestamps": self.timestamps,
+            "offsets": self.offsets,
+            "last_timestamp": self.last_timestamp,
+        })
+
+    @classmethod
+    def from_json(cls, data: str) -> "LogFileIndex":
+        return cls(**json.loads(data))
+
+
+def parse_header(match: re.Match) -> Tuple[float, str]:
+    """Return timestamp and level name from matched record header."""
+    year, month, day, hour, minute, second, millis, level = match.groups()
+    timestamp = datetime(
+        int(year), int(month), int(day), int(hour), int(minute), int(second), int(millis) * 1000,
+    ).timestamp()
+    return timestamp, level.decode("ascii")
+
+
+def iter_records_reverse(data: mmap.mmap, start: int, end: int) -> Iterator[Tuple[re.Match, bytes]]:
+    """
+    Yield `(header, record)` pairs from `end` back to `start`, newest first.
+    Lines without a header (e.g. tracebacks) are attached to the record above them.
+    """
+    position = end
+    continuation: List[bytes] = []
+
+    while position > start:
+        newline = data.rfind(b"\n", start, position - 1)
+        line_start = newline + 1 if newline != -1 else start
+        line = data[line_start:position]
+        position = line_start
+
+        header = RECORD_HEADER_RE.match(line)
+        if header is None:
+            continuation.append(line)
+            continue
+
+        if continuation:
+            continuation.reverse()
+            line = line + b"".join(continuation)
+            continuation = []
+
+        yield header, line
+
+
+class LogFileSearcher:
+    """Search records in the current log file and its rotated backups."""
+
+    def __init__(self, base_filename: str, backup_count: int, index_dir: str, index_step: int):
+        self.base_filename = os.path.abspath(base_filename)
+        self.backup_count = backup_count
+        self.index_dir = os.path.abspath(index_dir)
+        self.index_step = index_step
+        self._indexes: Dict[int, LogFileIndex] = {}
+        self._lock = threading.Lock()
+
+    def log_files(self) -> List[str]:
+        """Existing log files, newest first."""
+        names = [self.base_filename] + [
+            f"{self.base_filename}.{number}" for number in range(1, self.backup_count + 1)
+        ]
+        return [name for name in names if os.path.exists(name)]
+
+    def search(
+        self,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        min_level: int = logging.NOTSET,
+        text: Optional[str] = None,
+        limit: int = 50,
+    ) -> List[dict]:
+        """Return up to `limit` newest matching records in chronological order."""
+        since_ts = since.timestamp() if since else None
+        until_ts = until.timestamp() if until else None
+        # compared with decoded records, `bytes.lower` folds ASCII letters only
+        needle = text.casefold() if text else None
+
+        found: List[dict] = []
+
+        for path in self.log_files():
+            try:
+                with open(path, "rb") as file:
+                    size = os.fstat(file.fileno()).st_size
+                    if size == 0:
+                        continue
+
+                    with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                        index = self._get_index(file, data)
+
+                        if index.first_timestamp is None:
+                            continue
+                        if since_ts is not None and index.last_timestamp < since_ts:
+                            # rotated files are older still
+                            break
+                        if until_ts is not None and index.first_timestamp > until_ts:
+                            continue
+
+                        start = index.offset_before(since_ts) if since_ts is not None else 0
+                        end = index.offset_after(until_ts) if until_ts is not None else index.indexed_size
+
+                        for header, record in iter_records_reverse(data, start, end):
+                            timestamp, level = parse_header(header)
+
+                            if since_ts is not None and timestamp < since_ts:
+                                break
+                            if until_ts is not None and timestamp > until_ts:
+                                continue
+                            level_number = logging.getLevelName(level)
+                            if isinstance(level_number, int) and level_number < min_level:
+                                continue
+                            message = record.decode("utf-8", errors="replace").rstrip("\n")
+                            if needle is not None and needle not in message.casefold():
+                                continue
+
+                            found.append(dict(level=level, message=message))
+                            if len(found) >= limit:
+                                found.reverse()
+                                return found
+
+            except FileNotFoundError:
+                # file was rotated away between listing and opening
+                continue
+
+        found.reverse()
+        return found
+
+    def tail(self, count: int, min_level: int = logging.NOTSET) -> List[dict]:
+        """Return last `count` records reading files backwards from the end."""
+        return self.search(min_level=min_level, limit=count)
+
+    def _index_path(self, inode: int) -> str:
+        return os.path.join(self.index_dir, f"{inode}.json")
+
+    def _get_index(self, file, data: mmap.mmap) -> LogFileIndex:
+        """Return up-to-date index for the opened file, loading or (incrementally) building it."""
+        inode = os.fstat(file.fileno()).st_ino
+        head = data[:HEAD_SIZE].hex()
+
+        with self._lock:
+            index = self._indexes.get(inode) or self._load_index(inode)
+
+            if index is None or index.head != head or index.indexed_size > len(data):
+                index = LogFileIndex(inode=inode, head=head)
+                self._prune_indexes()
+
+            if index.indexed_size < len(data):
+                self._extend_index(index, data)
+                self._save_index(index)
+
+            self._indexes[inode] = index
+            return index
+
+    def _extend_index(self, index: LogFileIndex, data: mmap.mmap) -> None:
+        """Index complete lines written after `index.indexed_size`."""
+        position = index.indexed_size
+        last_sampled = index.offsets[-1] if index.offsets else None
+
+        while True:
+            newline = data.find(b"\n", position)
+            if newline == -1:
+                # incomplete line is indexed after it is written to the end
+                break
+
+            header = RECORD_HEADER_RE.match(data, position, newline)
+            if header is not None:
+                timestamp, _ = parse_header(header)
+                index.last_timestamp = timestamp
+
+                if last_sampled is None or position - last_sampled >= self.index_step:
+                    index.timestamps.append(timestamp)
+                    index.offsets.append(position)
+                    last_sampled = position
+
+            position = newline + 1
+
+        index.indexed_size = position
+
+    def _prune_indexes(self) -> None:
+        """Remove indexes of files deleted by rotation."""
+        live_inodes = set()
+        for path in self.log_files():
+            try:
+                live_inodes.add(os.stat(path).st_ino)
+            except FileNotFoundError:
+                continue
+
+        try:
+            names = os.listdir(self.index_dir)
+        except OSError:
+            return
+
+        for name in names:
+            inode, _, extension = name.partition(".")
+            if extension == "json" and inode.isdigit() and int(inode) not in live_inodes:
+                self._indexes.pop(int(inode), None)
+                try:
+                    os.remove(os.path.join(self.index_dir, name))
+                except OSError:
+                    pass
+
+    def _load_index(self, inode: int) -> Optional[LogFileIndex]:
+        try:
+            with open(self._index_path(inode)) as file:
+                return LogFileIndex.from_json(file.read())
+        except (OSError, ValueError, TypeError):
+            return None
+
+    def _save_index(self, index: LogFileIndex) -> None:
+        path = self._index_path(index.inode)
+        try:
+            os.makedirs(self.index_dir, exist_ok=True)
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, "w") as file:
+                file.write(index.to_json())
+            os.replace(tmp_path, path)
+        except OSError:
+            # index stays in memory only, it will be rebuilt by other processes
+            pass
@@ -1,11 +1,33 @@
 import csv
+import hashlib
 import io
 import zipfile
-from typing import List
+from typing import BinaryIO, List, Tuple
+
+from main.utils.images import UploadTooLargeError
+
+READ_CHUNK_SIZE = 64 * 1024
+
+
+def read_with_digest(stream: BinaryIO, max_size: int, chunk_size: int = READ_CHUNK_SIZE) -> Tuple[bytes, str]:
+    """
+    Read uploaded file by chunks computing SHA-256 hex digest of its content on the way.
+    Raise UploadTooLargeError as soon as it exceeds `max_size` bytes.
+    """
+    digest = hashlib.sha256()
+    buffer = io.BytesIO()
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            return buffer.getvalue(), digest.hexdigest()
+        if buffer.tell() + len(chunk) > max_size:
+            raise UploadTooLargeError(f"Archive is larger than {max_size} bytes that can be queued")
+        digest.update(chunk)
+        buffer.write(chunk)
 
 
 def get_lines_from_csv(zip_file: bytes) -> List[str]:
-    """Get list of lines from csv file."""
+    """Get list of lines (first column of rows) from all CSV files of the archive in their order."""
 
     with zipfile.ZipFile(io.BytesIO(zip_file), 'r') as zip_ref:
         # search CSV files in archive
@@ -13,13 +35,13 @@ def get_lines_from_csv(zip_file: bytes) -> List[str]:
         if len(csv_files) == 0:
             raise ValueError('No CSV file found in the zip archive.')
 
-        csv_file = csv_files[0]
-
         lines = []
 
-        with zip_ref.open(csv_file) as csv_data:
-            csv_reader = csv.reader(io.TextIOWrapper(csv_data, 'utf-8'))
-            for row in csv_reader:
-                lines.append(row[0])
+        for csv_file in csv_files:
+            with zip_ref.open(csv_file) as csv_data:
+                csv_reader = csv.reader(io.TextIOWrapper(csv_data, 'utf-8'))
+                for row in csv_reader:
+                    if row:
+                        lines.append(row[0])
 
-    return lines
\ No newline at end of file
+    return lines
@@ -0,0 +1,34 @@
+"""add check schedule to web resource
+
+Revision ID: 8c41d2f0a7b3
+Revises: 02cbdcf38d93
+Create Date: 2026-10-19 12:05:13.418207
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '8c41d2f0a7b3'
+down_revision = '02cbdcf38d93'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('web_resource', schema=None) as batch_op:
+        batch_op.add_column(sa.Column(
+            'next_check_at',
+            sa.DateTime(timezone=True),
+            server_default=sa.text('now()'),
+            nullable=True,
+        ))
+        batch_op.add_column(sa.Column('check_interval', sa.Integer(), nullable=True))
+        batch_op.create_index(batch_op.f('ix_web_resource_next_check_at'), ['next_check_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('web_resource', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_web_resource_next_check_at'))
+        batch_op.drop_column('check_interval')
+        batch_op.drop_column('next_check_at')
@@ -0,0 +1,31 @@
+"""add content hash to file processing request
+
+Revision ID: a4d2c8e15b97
+Revises: f1b7d94c2e38
+Create Date: 2026-10-19 16:41:12.904315
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = 'a4d2c8e15b97'
+down_revision = 'f1b7d94c2e38'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('file_processing_request', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('content_hash', sa.String(length=64), nullable=True))
+        batch_op.add_column(sa.Column('size_bytes', sa.BigInteger(), nullable=True))
+        batch_op.add_column(sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True))
+        batch_op.create_index(batch_op.f('ix_file_processing_request_content_hash'), ['content_hash'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('file_processing_request', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_file_processing_request_content_hash'))
+        batch_op.drop_column('created_at')
+        batch_op.drop_column('size_bytes')
+        batch_op.drop_column('content_hash')
@@ -0,0 +1,28 @@
+"""add latest status index
+
+Revision ID: b5e07a9c3d12
+Revises: 8c41d2f0a7b3
+Create Date: 2026-10-19 13:21:47.902315
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = 'b5e07a9c3d12'
+down_revision = '8c41d2f0a7b3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('web_resource_status', schema=None) as batch_op:
+        batch_op.create_index(
+            'ix_web_resource_status_resource_id_request_time',
+            ['resource_id', 'request_time'],
+            unique=False,
+        )
+
+
+def downgrade():
+    with op.batch_alter_table('web_resource_status', schema=None) as batch_op:
+        batch_op.drop_index('ix_web_resource_status_resource_id_request_time')
@@ -0,0 +1,52 @@
+"""move processing errors to table
+
+Revision ID: c7e3f1a92d45
+Revises: a4d2c8e15b97
+Create Date: 2026-10-19 17:05:48.331207
+
+"""
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = 'c7e3f1a92d45'
+down_revision = 'a4d2c8e15b97'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('file_processing_error',
+    sa.Column('request_id', sa.Integer(), nullable=False),
+    sa.Column('line_number', sa.Integer(), nullable=False),
+    sa.Column('line', sa.String(), nullable=False),
+    sa.Column('reason', sa.String(length=64), nullable=False),
+    sa.ForeignKeyConstraint(['request_id'], ['file_processing_request.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('request_id', 'line_number')
+    )
+
+    # line numbers were not stored, array order is kept
+    op.execute(
+        "INSERT INTO file_processing_error (request_id, line_number, line, reason) "
+        "SELECT id, line_number, line, 'unknown' "
+        "FROM file_processing_request, unnest(error_urls) WITH ORDINALITY AS errors(line, line_number) "
+        "WHERE error_urls IS NOT NULL"
+    )
+
+    with op.batch_alter_table('file_processing_request', schema=None) as batch_op:
+        batch_op.drop_column('error_urls')
+
+
+def downgrade():
+    with op.batch_alter_table('file_processing_request', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('error_urls', postgresql.ARRAY(sa.VARCHAR()), autoincrement=False, nullable=True))
+
+    op.execute(
+        "UPDATE file_processing_request SET error_urls = errors.lines "
+        "FROM (SELECT request_id, array_agg(line ORDER BY line_number) AS lines "
+        "FROM file_processing_error GROUP BY request_id) AS errors "
+        "WHERE errors.request_id = file_processing_request.id"
+    )
+
+    op.drop_table('file_processing_error')
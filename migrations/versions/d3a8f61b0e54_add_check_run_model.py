@@ -0,0 +1,49 @@
+"""add check run model
+
+Revision ID: d3a8f61b0e54
+Revises: b5e07a9c3d12
+Create Date: 2026-10-19 14:02:36.115820
+
+"""
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = 'd3a8f61b0e54'
+down_revision = 'b5e07a9c3d12'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # enum type was created with file processing request model
+    StatusOption = postgresql.ENUM(
+        'INPROCESS', 'SUCCEEDED', 'FAILED', 'PENDING', name='statusoption', create_type=False,
+    )
+
+    op.create_table('check_run',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('status', StatusOption, nullable=False),
+    sa.Column('started_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.Column('finished_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('last_resource_id', sa.Integer(), nullable=True),
+    sa.Column('total_count', sa.Integer(), nullable=True),
+    sa.Column('checked_count', sa.Integer(), nullable=False),
+    sa.Column('timeouts_count', sa.Integer(), nullable=False),
+    sa.Column('fast_failed_count', sa.Integer(), nullable=False),
+    sa.Column('bytes_received', sa.BigInteger(), nullable=False),
+    sa.Column('elapsed_seconds', sa.Float(), nullable=False),
+    sa.Column('resumed_count', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('check_run', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_check_run_status'), ['status'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('check_run', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_check_run_status'))
+
+    op.drop_table('check_run')
@@ -0,0 +1,39 @@
+"""add probe latency
+
+Revision ID: e9c4b2a7f610
+Revises: d3a8f61b0e54
+Create Date: 2026-10-19 15:10:04.551637
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = 'e9c4b2a7f610'
+down_revision = 'd3a8f61b0e54'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('web_resource_status', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('ttfb_ms', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('total_ms', sa.Integer(), nullable=True))
+
+    op.create_table('resource_latency_bucket',
+    sa.Column('resource_id', sa.Integer(), nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('metric', sa.String(length=8), nullable=False),
+    sa.Column('bucket', sa.SmallInteger(), nullable=False),
+    sa.Column('probes', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['resource_id'], ['web_resource.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('resource_id', 'day', 'metric', 'bucket')
+    )
+
+
+def downgrade():
+    op.drop_table('resource_latency_bucket')
+
+    with op.batch_alter_table('web_resource_status', schema=None) as batch_op:
+        batch_op.drop_column('total_ms')
+        batch_op.drop_column('ttfb_ms')
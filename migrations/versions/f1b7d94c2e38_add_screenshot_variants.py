@@ -0,0 +1,48 @@
+"""add screenshot variants
+
+Revision ID: f1b7d94c2e38
+Revises: e9c4b2a7f610
+Create Date: 2026-10-19 16:02:37.218490
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = 'f1b7d94c2e38'
+down_revision = 'e9c4b2a7f610'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('web_resource', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('screenshot_mimetype', sa.String(), nullable=True))
+        batch_op.add_column(sa.Column('screenshot_updated_at', sa.DateTime(timezone=True), nullable=True))
+
+    # screenshots uploaded before were shown as PNG,
+    # their variants are made by `flask screenshots backfill` after the upgrade
+    op.execute(
+        "UPDATE web_resource SET screenshot_mimetype = 'image/png', screenshot_updated_at = now() "
+        "WHERE screenshot IS NOT NULL"
+    )
+
+    op.create_table('screenshot_variant',
+    sa.Column('resource_id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=16), nullable=False),
+    sa.Column('mimetype', sa.String(), nullable=False),
+    sa.Column('width', sa.Integer(), nullable=False),
+    sa.Column('height', sa.Integer(), nullable=False),
+    sa.Column('content', sa.LargeBinary(), nullable=False),
+    sa.Column('source_updated_at', sa.DateTime(timezone=True), nullable=False),
+    sa.ForeignKeyConstraint(['resource_id'], ['web_resource.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('resource_id', 'name')
+    )
+
+
+def downgrade():
+    op.drop_table('screenshot_variant')
+
+    with op.batch_alter_table('web_resource', schema=None) as batch_op:
+        batch_op.drop_column('screenshot_updated_at')
+        batch_op.drop_column('screenshot_mimetype')